@@ -1,3 +1,5 @@
+from gates import GATE_KIND, SHIFT_AMOUNT, SHL, SHR
+
 def int_to_binary(n, size):
     assert 0 <= n < 2**size
     if n == 0:
@@ -35,15 +37,15 @@ def seed_to_instance(nb_bits, seed):
 
 """Opérations sur les bitvectors sous forme de liste"""
 def shift(bitvector, n, shift):
-    assert shift in ["<<", ">>"]
+    assert shift in [SHL, SHR]
     m = len(bitvector)
     if n == 0:
         return bitvector
     if n >= m:
         return [0 for i in range(m)]
-    if shift == "<<":
+    if shift == SHL:
         return bitvector[n:] + [0 for i in range(n)]
-    if shift == ">>":
+    if shift == SHR:
         return [0 for i in range(n)] + bitvector[:m-n]
     
 def and_bitv(a, b):
@@ -84,26 +86,31 @@ def multiply_list(l_1, l_2):
         l.append(l_1[i]*l_2[i])
     return l
 
+"""Table de dispatch indexée par la famille de la porte (gates.GATE_KIND)"""
+def gate_id(children_result, n):
+    return children_result[0]
+
+def gate_not(children_result, n):
+    return not_bitv(children_result[0])
+
+def gate_and(children_result, n):
+    return and_bitv(children_result[0], children_result[1])
+
+def gate_or(children_result, n):
+    return or_bitv(children_result[0], children_result[1])
+
+def gate_xor(children_result, n):
+    return xor_bitv(children_result[0], children_result[1])
+
+def gate_shl(children_result, n):
+    return shift(children_result[0], n, SHL)
+
+def gate_shr(children_result, n):
+    return shift(children_result[0], n, SHR)
+
+GATE_FUNCTIONS = [gate_id, gate_not, gate_and, gate_or, gate_xor, gate_shl, gate_shr]
+
 def calcul_gate(children_result, value, input):
-    arity = len(children_result)
-    if arity == 0:
+    if not children_result:
         return input[value]
-    elif arity == 1:
-        result = children_result[0]
-        if value == "not":
-            return not_bitv(result)
-        if value == "id":
-            return result
-        if value[:2] in ["<<", ">>"]:
-            n = int(value[2:])
-            return shift(result, n, value[:2])
-    elif arity == 2:
-        result1 = children_result[0]
-        result2 = children_result[1]
-        if value == "or":
-            return or_bitv(result1, result2)
-        if value == "and":
-            return and_bitv(result1, result2)
-        if value == "xor":
-            return xor_bitv(result1, result2)
-
+    return GATE_FUNCTIONS[GATE_KIND[value]](children_result, SHIFT_AMOUNT[value])
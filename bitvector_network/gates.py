@@ -0,0 +1,58 @@
+"""Portes internées sous forme de petits entiers.
+Les 7 premiers codes sont les familles de portes, chaque décalage "<<m" ou ">>m"
+a son propre code, attribué de façon déterministe : 7 + 2*(m-1) pour "<<m" et
+8 + 2*(m-1) pour ">>m". Les feuilles gardent l'indice de leur variable."""
+
+ID, NOT, AND, OR, XOR, SHL, SHR = range(7)
+GATES = {1: [ID, NOT, SHL, SHR], 2: [AND, OR, XOR]}
+
+GATE_NAMES = ["id", "not", "and", "or", "xor", "<<", ">>"]
+GATE_KIND = [ID, NOT, AND, OR, XOR, SHL, SHR]
+GATE_ARITY = [1, 1, 2, 2, 2, 1, 1]
+SHIFT_AMOUNT = [0, 0, 0, 0, 0, 0, 0]
+OPCODES = {name: op for op, name in enumerate(GATE_NAMES)}
+
+_candidate_gates = {}
+
+def shift_opcode(kind, m):
+    assert kind in [SHL, SHR] and m >= 1
+    op = 7 + 2*(m-1) + (kind - SHL)
+    while len(GATE_NAMES) <= op:
+        new_op = len(GATE_NAMES)
+        new_kind = SHL + (new_op - 7) % 2
+        new_m = (new_op - 7) // 2 + 1
+        GATE_NAMES.append(GATE_NAMES[new_kind] + str(new_m))
+        GATE_KIND.append(new_kind)
+        GATE_ARITY.append(1)
+        SHIFT_AMOUNT.append(new_m)
+        OPCODES[GATE_NAMES[new_op]] = new_op
+    return op
+
+def gate_opcode(name):
+    if name not in OPCODES:
+        kind = OPCODES[name[:2]]
+        return shift_opcode(kind, int(name[2:]))
+    return OPCODES[name]
+
+def gate_name(op):
+    return GATE_NAMES[op]
+
+def value_name(value, arity):
+    # nom affiché ou écrit dans une seed : indice de variable pour les feuilles
+    if arity == 0:
+        return str(value)
+    return GATE_NAMES[value]
+
+def candidate_gates(arity, nb_bits, n):
+    key = (arity, nb_bits, n)
+    if key not in _candidate_gates:
+        if arity == 0:
+            table = list(range(n))
+        elif arity == 1:
+            table = [ID, NOT]
+            table += [shift_opcode(SHL, i) for i in range(1, nb_bits + 1)]
+            table += [shift_opcode(SHR, i) for i in range(1, nb_bits + 1)]
+        else:
+            table = GATES[2]
+        _candidate_gates[key] = tuple(table)
+    return _candidate_gates[key]
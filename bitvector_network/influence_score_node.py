@@ -1,4 +1,5 @@
-from node import Node, GATES
+from node import Node
+from gates import GATE_KIND, SHIFT_AMOUNT, ID, NOT, AND, OR, XOR, SHL, SHR, candidate_gates
 from bitvector_tools import*
 
 class InfluenceScoreNode(Node):
@@ -30,17 +31,8 @@ class InfluenceScoreNode(Node):
         self.finish_score(nb_input*nb_bits)
 
     def init_score(self, n, nb_bits):
-        arity = len(self.children)
         self.score = {}
-        l_gates = list(range(n))
-        if arity == 1:
-            l_gates = ["id", "not"]
-            l_gates += ["<<" + str(i) for i in range(1, nb_bits + 1)]
-            l_gates += [">>" + str(i) for i in range(1, nb_bits + 1)]
-        if arity == 2:
-            l_gates = GATES[arity]
-
-        for gate in l_gates:
+        for gate in candidate_gates(len(self.children), nb_bits, n):
             if gate != self.value:
                 self.score[gate] = 0
 
@@ -85,19 +77,20 @@ class InfluenceScoreNode(Node):
     def update_influence(self):
         arity = len(self.children)
         nb_bits = len(self.influence)
-        antishift = {"<<":">>", ">>":"<<"}
+        antishift = {SHL: SHR, SHR: SHL}
 
         if arity == 0:
             return
+        kind = GATE_KIND[self.value]
         if arity == 1:
             child = self.children[0]
-            if self.value == "id":
+            if kind == ID:
                 child.influence = self.influence
-            if self.value == "not":
+            if kind == NOT:
                 child.influence = multiply_list(self.influence, [-1 for i in range(nb_bits)])
-            if self.value[:2] in ["<<", ">>"]:
-                n = int(self.value[2:])
-                child.influence = shift(self.influence, n, antishift[self.value[:2]])
+            if kind in [SHL, SHR]:
+                n = SHIFT_AMOUNT[self.value]
+                child.influence = shift(self.influence, n, antishift[kind])
             child.update_influence()
 
         if arity == 2:
@@ -105,14 +98,14 @@ class InfluenceScoreNode(Node):
             child2 = self.children[1]
             mask1 = [1 for i in range(nb_bits)]
             mask2 = [1 for i in range(nb_bits)]
-            assert self.value in GATES[2]
-            if self.value == "or":
+            assert kind in [AND, OR, XOR]
+            if kind == OR:
                 mask1 = [1-bit for bit in child2.result]
                 mask2 = [1-bit for bit in child1.result]
-            if self.value == "and":
+            if kind == AND:
                 mask1 = child2.result
                 mask2 = child1.result
-            if self.value == "xor":
+            if kind == XOR:
                 mask1 = [-2*bit + 1 for bit in child2.result]
                 mask2 = [-2*bit + 1 for bit in child1.result]
 
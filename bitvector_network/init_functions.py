@@ -1,6 +1,6 @@
 import random
 from softmax_node import SoftmaxNode as Node
-from node import GATES
+from gates import GATES, SHL, SHR, gate_opcode, shift_opcode
 from bitvector_tools import*
 
 def create_rd_formula(n, size, nb_bits):
@@ -13,9 +13,9 @@ def create_rd_formula(n, size, nb_bits):
         nb_gate = len(GATES[1])
         i = random.randint(1, nb_gate - 1)
         gate = GATES[1][i]
-        if gate == "<<" or gate == ">>":
+        if gate == SHL or gate == SHR:
             j = random.randint(1, nb_bits)
-            gate = gate + str(j)
+            gate = shift_opcode(gate, j)
         x = random.randint(0, n-1)
         node = Node(gate)
         node.add_child(Node(x))
@@ -53,7 +53,7 @@ def recreate_formula(seed):
     if seed[i:] == "":
         return Node(int(value))
     
-    node = Node(value)
+    node = Node(gate_opcode(value))
     
     while seed[i:] != "":
         j, size = next_token()
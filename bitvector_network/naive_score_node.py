@@ -1,4 +1,5 @@
-from node import Node, GATES
+from node import Node
+from gates import candidate_gates
 
 class NaiveScoreNode(Node):
     def __init__(self, value = None):
@@ -22,15 +23,7 @@ class NaiveScoreNode(Node):
         nb_bits = len(instance[0][0][0])
         current_value = self.value
         self.score = {}
-        l_gates = list(range(n))
-        if arity == 1:
-            l_gates = ["id", "not"]
-            l_gates += ["<<" + str(i) for i in range(1, nb_bits + 1)]
-            l_gates += [">>" + str(i) for i in range(1, nb_bits + 1)]
-        if arity == 2:
-            l_gates = GATES[arity]
-
-        for i in l_gates:
+        for i in candidate_gates(arity, nb_bits, n):
             if i != current_value:
                 self.value = i
                 self.score[i] = root.score_formula(instance) - score
@@ -1,5 +1,5 @@
 from bitvector_tools import*
-GATES = {1: ["id", "not", "<<", ">>"], 2: ["and", "or", "xor"]}
+from gates import GATES, gate_name, value_name
 
 class Node:
     def __init__(self, value = None):
@@ -16,16 +16,19 @@ class Node:
         child.parent = self
 
     def image(self, param = "value", prefixe="", dernier=True):
-        node_content = str(self.value)
+        arity = len(self.children)
+        node_content = value_name(self.value, arity)
         if param == "score":
             round_score = {}
             for key in self.score:
-                round_score[key] = round(self.score[key], 2)
+                name = gate_name(key) if arity else key
+                round_score[name] = round(self.score[key], 2)
             node_content = str(round_score)
         if param == "proba":
             round_proba = {}
             for key in self.proba:
-                round_proba[key] = round(self.proba[key], 2)
+                name = gate_name(key) if arity else key
+                round_proba[name] = round(self.proba[key], 2)
             node_content = str(round_proba)
         if param == "result":
             node_content = str(self.result)
@@ -52,7 +55,7 @@ class Node:
         self.update_tree_proba()
 
     def get_seed(self, split_c = " "):
-        seed = str(self.value)
+        seed = value_name(self.value, len(self.children))
 
         for child in self.children:
             child_seed = child.get_seed(split_c)
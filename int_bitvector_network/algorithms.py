@@ -1,32 +1,295 @@
 from init_functions import*
+from flat_formula import node_to_flat
+from enumeration import enumerative_search
+from semantic_backprop import signature_index, best_semantic_move, apply_semantic_move
+from population import score_population, copy_formula, crossover, tournament
 from time import time
+from math import exp
+from collections import deque
+from multiprocessing import Pool
+from score_cache import ScoreCache
+from shared_instance import share_instance, attach_instance, release_instance
 
-def evolution(f, instance, tau = 5, N = 10):
+# annealing_evolution : mouvements tirés à la fois, et nombre de propositions entre deux ajustements de la température
+ANNEALING_BATCH = 16
+ANNEALING_WINDOW = 20
+# pénalité de score d'un mouvement tabou dans evolution, son poids softmax est divisé par exp(tau*TABU_PENALTY)
+TABU_PENALTY = 0.1
+
+def add_stats(stats, f):
+    # cumule dans stats (s'il est fourni) les compteurs du dernier re-scoring de f
+    if stats is not None:
+        stats["evaluated"] = stats.get("evaluated", 0) + f.nb_evaluated
+        stats["skipped"] = stats.get("skipped", 0) + f.nb_skipped
+        stats["rescored"] = stats.get("rescored", 0) + 1
+
+def evolution(f, instance, tau = 5, N = 10, stats = None, cache = None, tabu = 0):
+    # stats : dictionnaire optionnel où sont cumulés les compteurs de la recherche
+    # cache : ScoreCache optionnel, une formule déjà vue reprend ses tables sans re-scoring
+    # tabu : nombre de derniers mouvements dont le retour en arrière est défavorisé
     score = 0
     f.change_tau(tau)
+    recent_moves = deque(maxlen=tabu)
+    if cache is not None and stats is not None:
+        # taux de succès affiché même sans aucun succès
+        stats.setdefault("cache_hits", 0)
+    for i in range(N):
+        score = cache.lookup(f, instance) if cache is not None else None
+        if score is None:
+            score = f.score_formula(instance)
+            # print(score)
+            f.update_tree_score(instance)
+            if cache is not None:
+                cache.store(f, score)
+            add_stats(stats, f)
+        elif stats is not None:
+            stats["cache_hits"] = stats.get("cache_hits", 0) + 1
+        if score > 0.99:
+            return score
+        if recent_moves:
+            f.penalize(recent_moves, TABU_PENALTY)
+        move = f.softmax()
+        if tabu and move is not None:
+            recent_moves.append(move)
+
+    return score
+
+def best_evolution(f, instance, tau = 5, N = 10, stats = None):
+    # comme evolution, mais renvoie (f, meilleur score, nombre d'itérations de la
+    # boucle effectuées) avec f ramenée à son meilleur état en défaisant les
+    # mouvements du journal postérieurs à ce meilleur état
+    f.change_tau(tau)
+    f.start_journal()
+    best_score, best_mark = -1, 0
     for i in range(N):
         score = f.score_formula(instance)
-        # print(score)
+        if score > best_score:
+            best_score, best_mark = score, f.snapshot()
+        if score > 0.99:
+            return f, score, i + 1
         f.update_tree_score(instance)
+        add_stats(stats, f)
+        f.softmax()
+
+    score = f.score_formula(instance)
+    if score > best_score:
+        return f, score, N
+    f.rollback(best_mark)
+    return f, best_score, N
+
+def minibatch_evolution(f, instance, tau = 5, N = 10, batch_size = 64, stats = None):
+    # comme evolution, mais les tables de score sont estimées à chaque itération sur
+    # batch_size exemples tirés au hasard ; l'instance complète n'est évaluée que si
+    # l'estimation dépasse 0.99, et un faux positif double la taille du lot.
+    # Instance et lots sont passés aux scoreurs déjà empaquetés : les lots ne
+    # remplissent pas le cache de pack_instance
+    packed = pack_instance(instance)
+    examples = list_instance(instance)[1:]
+    score = 0
+    f.change_tau(tau)
+    for i in range(N):
+        if batch_size < len(examples):
+            batch = pack_examples([packed[0]] + random.sample(examples, batch_size))
+        else:
+            batch = packed
+        score = f.score_formula(batch)
+        if score > 0.99 and batch is not packed:
+            score = f.score_formula(packed)
+            if score <= 0.99:
+                batch_size = 2*batch_size
+                if stats is not None:
+                    stats["false_positives"] = stats.get("false_positives", 0) + 1
         if score > 0.99:
             return score
+        f.update_tree_score(batch)
+        add_stats(stats, f)
+        f.softmax()
+
+    return f.score_formula(packed)
+
+def failing_examples(f, packed, examples):
+    # exemples (examples : forme liste, dans l'ordre des voies de packed) sur
+    # lesquels la formule se trompe, en une passe empaquetée
+    nb_bits, nb_lanes, inputs, y = packed
+    errors = unpack_lanes(f.calcul_incremental(inputs, nb_bits, nb_lanes) ^ y, nb_bits, nb_lanes)
+    return [examples[k] for k in range(nb_lanes) if errors[k]]
+
+def cegis_evolution(f, instance, tau = 5, N = 10, nb_start = 8, nb_added = 2, stats = None):
+    # la recherche ne voit qu'un ensemble de travail de nb_start exemples ; quand il
+    # est entièrement satisfait, on vérifie l'instance complète et on y ajoute
+    # nb_added contre-exemples. Chaque nouvel ensemble est une nouvelle liste, le
+    # cache de pack_instance étant indexé par l'identité de l'instance
+    packed = pack_instance(instance)
+    examples = list_instance(instance)[1:]
+    working = [packed[0]] + random.sample(examples, min(nb_start, len(examples)))
+    score = 0
+    f.change_tau(tau)
+    for i in range(N):
+        if f.score_formula(working) == 1:
+            score = f.score_formula(packed)
+            if score > 0.99:
+                return score
+            failing = failing_examples(f, packed, examples)
+            counterexamples = random.sample(failing, min(nb_added, len(failing)))
+            working = working + counterexamples
+            if stats is not None:
+                stats["counterexamples"] = stats.get("counterexamples", 0) + len(counterexamples)
+        f.update_tree_score(working)
+        add_stats(stats, f)
         f.softmax()
 
+    return f.score_formula(packed)
+
+def semantic_evolution(f, instance, tau = 5, N = 10, stats = None, p_semantic = 0.7):
+    # comme evolution, mais avec probabilité p_semantic un petit sous-arbre est
+    # remplacé par la formule de l'index qui améliore le plus le score, softmax sinon
+    # (toujours appliquer le remplacement bloque la recherche dans des optima locaux)
+    index = signature_index(instance)
+    score = 0
+    f.change_tau(tau)
+    for i in range(N):
+        score = f.score_formula(instance)
+        f.update_tree_score(instance)
+        add_stats(stats, f)
+        if score > 0.99:
+            return score
+        gain, node, signature = best_semantic_move(f, index)
+        if gain > 0 and random.random() < p_semantic:
+            apply_semantic_move(node, signature, index)
+            if stats is not None:
+                stats["semantic"] = stats.get("semantic", 0) + 1
+        else:
+            f.softmax()
+
     return score
 
-def progressive_evolution(f, instance, N, tau_max=10):
+def genetic_evolution(population, instance, N = 100, nb_elites = 2, k = 2, p_crossover = 0.5, p_mutation = 1):
+    # N générations : les nb_elites meilleurs sont gardés, les autres individus sont
+    # des croisements de parents choisis par tournoi, mutés par softmax
+    for generation in range(N):
+        scores = score_population(population, instance)
+        if max(scores) > 0.99:
+            return max(scores)
+        order = sorted(range(len(population)), key=lambda i: scores[i], reverse=True)
+        new_population = [population[i] for i in order[:nb_elites]]
+        while len(new_population) < len(population):
+            parent = tournament(population, scores, k)
+            if random.random() < p_crossover:
+                child = crossover(parent, tournament(population, scores, k))
+            else:
+                child = copy_formula(parent)
+            if random.random() < p_mutation:
+                child.update_tree_score(instance)
+                child.softmax()
+            new_population.append(child)
+        population = new_population
+
+    return max(score_population(population, instance))
+
+def parallel_tempering(chains, instance, taus, N = 100, swap_every = 10, new_chain = None):
+    # une chaîne softmax par tau ; toutes les swap_every itérations, deux chaînes
+    # voisines échangent leurs états avec la probabilité de Metropolis
+    # min(1, exp((tau_j - tau_i)(score_i - score_j))) pour des lois en exp(tau*score),
+    # new_chain fournit si besoin un nouvel état pour la chaîne au tau le plus bas.
+    # Seul le test de succès est groupé (score_population) : les tables de score
+    # sont calculées chaîne par chaîne, leurs arbres n'ayant pas la même forme
+    for chain, tau in zip(chains, taus):
+        chain.change_tau(tau)
+    for i in range(N):
+        scores = score_population(chains, instance)
+        if max(scores) > 0.99:
+            return max(scores)
+        if i % swap_every == swap_every - 1:
+            if new_chain is not None:
+                chains[0] = new_chain()
+                chains[0].change_tau(taus[0])
+                scores[0] = chains[0].score_formula(instance)
+            for k in range(len(chains) - 1):
+                delta = (taus[k+1] - taus[k])*(scores[k] - scores[k+1])
+                if delta >= 0 or random.random() < exp(delta):
+                    chains[k], chains[k+1] = chains[k+1], chains[k]
+                    scores[k], scores[k+1] = scores[k+1], scores[k]
+                    chains[k].change_tau(taus[k])
+                    chains[k+1].change_tau(taus[k+1])
+        for chain in chains:
+            chain.update_tree_score(instance)
+            chain.softmax()
+
+    return max(score_population(chains, instance))
+
+def annealing_evolution(f, instance, tau = 30, N = 100, temperature = 0.01, target_rate = 0.3, patience = 15, stats = None):
+    # recuit : un mouvement tiré par softmax est accepté selon Metropolis sur le gain
+    # prévu par les tables de score ; un refus ne modifie pas l'arbre, les tables
+    # restent valables et on tire un autre mouvement sans re-scorer.
+    # N borne le nombre de re-scorings complets, patience le nombre de re-scorings
+    # sans améliorer le meilleur score ; la température est ajustée pour viser
+    # un taux d'acceptation target_rate. f est laissée dans son meilleur état
+    f.change_tau(tau)
+    f.start_journal()
+    score = f.score_formula(instance)
+    best_score, best_mark = score, f.snapshot()
+    nb_rescored, last_best = 0, 0
+    nb_proposed, nb_accepted = 0, 0
+    while score <= 0.99 and nb_rescored < N and nb_rescored - last_best < patience:
+        f.update_tree_score(instance)
+        nb_rescored += 1
+        add_stats(stats, f)
+        accepted = False
+        while not accepted:
+            moves = f.sample_moves(ANNEALING_BATCH)
+            if not moves:
+                f.rollback(best_mark)
+                return best_score
+            for node, gate in moves:
+                delta = node.score[gate]
+                nb_proposed += 1
+                accepted = delta >= 0 or random.random() < exp(delta / temperature)
+                if accepted:
+                    nb_accepted += 1
+                if nb_proposed % ANNEALING_WINDOW == 0:
+                    rate = nb_accepted / ANNEALING_WINDOW
+                    temperature *= 1.2 if rate < target_rate else 1/1.2
+                    nb_accepted = 0
+                if accepted:
+                    f.apply_move(node, gate)
+                    break
+        score = f.score_formula(instance)
+        if score > best_score:
+            best_score, last_best, best_mark = score, nb_rescored, f.snapshot()
+
+    f.rollback(best_mark)
+    return best_score
+
+def progressive_evolution(f, instance, N, tau_max=10, stats = None):
     score = 0
     tau = 1
-    # (tau_max - tau)/step + 1 = N / 10
-    step = 10*(tau_max - tau)/(N-10)
-    for i in range(N//10):
-        score = evolution(f, instance, tau)
+    # (tau_max - tau)/step + 1 = N / 10, avec au moins une phase de min(N, 10) itérations
+    nb_phases = max(N//10, 1)
+    step = 10*(tau_max - tau)/(N-10) if nb_phases > 1 else 0
+    for i in range(nb_phases):
+        score = evolution(f, instance, tau, N = min(N, 10), stats=stats)
         if score > 0.99:
             return score
         tau += step
 
     return score
 
+def print_stats(stats):
+    if "cache_hits" in stats:
+        hits = stats["cache_hits"]
+        nb_lookups = hits + stats.get("rescored", 0)
+        print(f"Cache de scores : {hits} succès sur {nb_lookups} ({round(100*hits/nb_lookups, 1)} %)")
+    if "counterexamples" in stats:
+        print(f"Contre-exemples ajoutés à l'ensemble de travail : {stats['counterexamples']}")
+    if "false_positives" in stats:
+        print(f"Faux positifs du score estimé sur un lot : {stats['false_positives']}")
+    if "rescored" in stats:
+        print(f"Re-scorings complets de l'arbre : {stats['rescored']}")
+    nb_candidates = stats.get("evaluated", 0) + stats.get("skipped", 0)
+    if nb_candidates:
+        skipped = stats.get("skipped", 0)
+        print(f"Portes candidates ignorées (influence nulle) : {skipped} sur {nb_candidates} ({round(100*skipped/nb_candidates, 1)} %)")
+
 def algo_random(instance, n, size, nb_bits):
     new_formula = create_rd_formula(n, size, nb_bits)
     return new_formula.score_formula(instance)
@@ -47,15 +310,119 @@ def algo_softmax_progressif(instance, n, size, nb_bits):
     new_formula = create_rd_formula(n, size, nb_bits)
     return progressive_evolution(new_formula, instance, N=100, tau_max=10)
 
+def die_retry(instance, n, size, nb_bits, nb_restarts = 100, tau = 30, N = 100, evolve = None, flat = False):
+    # renvoie (meilleure formule, son score, nombre total d'itérations).
+    # evolve : recherche (f, instance, tau, N) -> score utilisée à la place de
+    # best_evolution ; la formule renvoyée est alors dans son dernier état et le
+    # nombre d'itérations vaut None. flat : formules en FlatFormula
+    best_formula, best_score, nb_iterations = None, -1, 0
+    for i in range(nb_restarts):
+        new_formula = create_rd_formula(n, size, nb_bits)
+        if flat:
+            new_formula = node_to_flat(new_formula)
+        if evolve is None:
+            new_formula, score, iterations = best_evolution(new_formula, instance, tau, N)
+            nb_iterations += iterations
+        else:
+            score, nb_iterations = evolve(new_formula, instance, tau, N), None
+        if score > best_score:
+            best_formula, best_score = new_formula, score
+        if best_score > 0.99:
+            break
+    return best_formula, best_score, nb_iterations
+
+# état des processus de parallel_die_retry, fixé une fois par processus par init_restart_worker
+restart_context = {}
+
+def init_restart_worker(handle, n, size, nb_bits, tau, N, seed):
+    restart_context["params"] = (attach_instance(handle), n, size, nb_bits, tau, N, seed)
+
+def run_restart(index):
+    # un redémarrage de die_retry, avec une graine propre à son indice
+    instance, n, size, nb_bits, tau, N, seed = restart_context["params"]
+    random.seed(f"{seed}_{index}")
+    new_formula, score, iterations = best_evolution(create_rd_formula(n, size, nb_bits), instance, tau, N)
+    return index, new_formula.get_seed(), score
+
+def parallel_die_retry(instance, n, size, nb_bits, nb_workers = None, nb_restarts = 100, tau = 30, N = 100, seed = 0):
+    # les redémarrages tournent sur nb_workers processus, les autres sont annulés au
+    # premier succès ; renvoie (meilleure formule, indice de son redémarrage, temps réel).
+    # Sans plusieurs coeurs, les processus ne font que se partager le même : le temps
+    # réel reste celui de die_retry (voir main.benchmark_restarts)
+    t0 = time()
+    best_seed, best_score, best_index = None, -1, None
+    # les processus lisent l'instance en mémoire partagée au démarrage
+    shm, handle = share_instance(instance)
+    params = (handle, n, size, nb_bits, tau, N, seed)
+    try:
+        with Pool(nb_workers, initializer=init_restart_worker, initargs=params) as pool:
+            for index, formula_seed, score in pool.imap_unordered(run_restart, range(nb_restarts)):
+                if score > best_score:
+                    best_seed, best_score, best_index = formula_seed, score, index
+                if best_score > 0.99:
+                    # la sortie du with appelle terminate : les redémarrages en cours sont abandonnés
+                    break
+    finally:
+        release_instance(shm)
+    return recreate_formula(best_seed), best_index, time() - t0
+
 def algo_die_retry(instance, n, size, nb_bits):
+    return die_retry(instance, n, size, nb_bits)[1]
+
+def algo_die_retry_flat(instance, n, size, nb_bits):
+    return die_retry(instance, n, size, nb_bits, evolve = evolution, flat = True)[1]
+
+def algo_semantic(instance, n, size, nb_bits):
+    return die_retry(instance, n, size, nb_bits, evolve = semantic_evolution)[1]
+
+def algo_genetic(instance, n, size, nb_bits):
+    # même budget que algo_die_retry (10000 formules), mais une grande population
+    # sur peu de générations : une petite population perd vite sa diversité
+    population = []
+    for i in range(500):
+        new_formula = create_rd_formula(n, size, nb_bits)
+        new_formula.change_tau(30)
+        population.append(new_formula)
+    return genetic_evolution(population, instance, N = 20)
+
+def algo_parallel_tempering(instance, n, size, nb_bits):
+    # même budget que algo_die_retry : 8 chaînes de 1250 itérations, taus en
+    # progression géométrique ; la chaîne la plus chaude repart d'une formule
+    # aléatoire à chaque échange, ce qui remplace les redémarrages de die_retry
+    taus = [4, 6, 9, 13, 19, 28, 42, 63]
+    chains = [create_rd_formula(n, size, nb_bits) for tau in taus]
+    new_chain = lambda: create_rd_formula(n, size, nb_bits)
+    return parallel_tempering(chains, instance, taus, N = 10000//len(taus), new_chain = new_chain)
+
+def algo_annealing(instance, n, size, nb_bits):
+    # redémarrages comme algo_die_retry, dans la limite de 10000 re-scorings
     score = 0
-    for i in range(100):
+    stats = {}
+    while stats.get("rescored", 0) < 10000:
         new_formula = create_rd_formula(n, size, nb_bits)
-        score = max(evolution(new_formula, instance, tau = 30, N=100), score)
+        score = max(annealing_evolution(new_formula, instance, N = 10000 - stats.get("rescored", 0), stats = stats), score)
         if score > 0.99:
             return score
     return score
 
+def algo_minibatch(instance, n, size, nb_bits):
+    return die_retry(instance, n, size, nb_bits, evolve = minibatch_evolution)[1]
+
+def algo_cegis(instance, n, size, nb_bits):
+    return die_retry(instance, n, size, nb_bits, evolve = cegis_evolution)[1]
+
+def algo_die_retry_tabu(instance, n, size, nb_bits):
+    evolve = lambda f, instance, tau, N: evolution(f, instance, tau, N, cache = ScoreCache(), tabu = 5)
+    return die_retry(instance, n, size, nb_bits, evolve = evolve)[1]
+
+def algo_enumerative(instance, n, size, nb_bits):
+    # l'énumération n'est exhaustive que si elle n'a pas atteint MAX_SIGNATURES ;
+    # sinon, faute d'avoir trouvé la cible, on complète par une recherche locale
+    formula, score, complete = enumerative_search(instance, n, size, nb_bits)
+    if score > 0.99 or complete:
+        return score
+    return max(score, die_retry(instance, n, size, nb_bits)[1])
+
 def raw_algo_softmax(tau, N, instance, n, size, nb_bits, progressive):
     new_formula = create_rd_formula(n, size, nb_bits)
     if progressive:
@@ -66,5 +433,16 @@ def algo_softmax(tau, N, progressive = False):
     # tau ou tau_max selon progressive
     return lambda instance, n, size, nb_bits: raw_algo_softmax(tau, N, instance, n, size, nb_bits, progressive)
 
-L_ALGO = [algo_random, algo_random_brute_force, algo_softmax_tau_eleve, algo_softmax_tau_moyen, algo_softmax_progressif, algo_die_retry]
-L_ALGO_STR = ["algo_random", "algo_random_brute_force", "algo_softmax_tau_eleve", "algo_softmax_tau_moyen", "algo_softmax_progressif", "algo_die_retry"]
\ No newline at end of file
+L_ALGO = [algo_random, algo_random_brute_force, algo_softmax_tau_eleve, algo_softmax_tau_moyen, algo_softmax_progressif, algo_die_retry, algo_die_retry_flat, algo_enumerative, algo_semantic, algo_genetic, algo_parallel_tempering, algo_annealing, algo_minibatch, algo_cegis, algo_die_retry_tabu]
+L_ALGO_STR = ["algo_random", "algo_random_brute_force", "algo_softmax_tau_eleve", "algo_softmax_tau_moyen", "algo_softmax_progressif", "algo_die_retry", "algo_die_retry_flat", "algo_enumerative", "algo_semantic", "algo_genetic", "algo_parallel_tempering", "algo_annealing", "algo_minibatch", "algo_cegis", "algo_die_retry_tabu"]
+
+def get_algo(algoname):
+    # nom de L_ALGO_STR, ou "algo_softmax<tau>_<N>_<progressive>" ; un nom suffit
+    # à retrouver l'algorithme dans un autre processus, contrairement aux lambdas
+    if algoname in L_ALGO_STR:
+        return L_ALGO[L_ALGO_STR.index(algoname)]
+    if algoname.startswith("algo_softmax"):
+        n = len("algo_softmax")
+        tau, N, progressive = [int(param) for param in algoname[n:].split("_")]
+        return algo_softmax(tau, N, progressive)
+    raise ValueError(f"algorithme inconnu : {algoname}")
@@ -1,3 +1,11 @@
+from functools import lru_cache
+from gates import GATE_KIND, SHIFT_AMOUNT, SHL, SHR
+
+MAX_PACKED_INSTANCES = 16
+_packed_instances = {}
+# formes liste reconstruites par list_instance, par id de la forme empaquetée
+_listed_instances = {}
+
 def instance_to_seed(instance):
     seed = ""
     for input, y in instance[1:]:
@@ -18,44 +26,107 @@ def seed_to_instance(nb_bits, seed):
         instance.append((input, y))
     return instance
 
-def bit_not(n, nb_bits):
-    return (1 << nb_bits) - 1 - n
+# Représentation par voies : l'exemple k occupe les bits [k*nb_bits, (k+1)*nb_bits)
+# d'un seul entier, nb_lanes = 1 correspond au calcul exemple par exemple
+def pack_lanes(values, nb_bits):
+    return int("".join(format(value, f"0{nb_bits}b") for value in reversed(values)), 2)
+
+def unpack_lanes(n, nb_bits, nb_lanes):
+    s = format(n, f"0{nb_bits*nb_lanes}b")
+    size = len(s)
+    return [int(s[size - (k+1)*nb_bits:size - k*nb_bits], 2) for k in range(nb_lanes)]
+
+@lru_cache(maxsize=256)
+def lane_mask(mask, nb_bits, nb_lanes):
+    if nb_lanes == 1:
+        return mask
+    return int(format(mask, f"0{nb_bits}b")*nb_lanes, 2)
+
+def pack_examples(instance):
+    # forme empaquetée (nb_bits, nb_lanes, entrées, y), sans passer par le cache
+    nb_bits = instance[0]
+    nb_lanes = len(instance) - 1
+    n = len(instance[1][0])
+    inputs = [pack_lanes([input[i] for input, y in instance[1:]], nb_bits) for i in range(n)]
+    y = pack_lanes([y for input, y in instance[1:]], nb_bits)
+    return (nb_bits, nb_lanes, inputs, y)
+
+def pack_instance(instance):
+    # une instance déjà empaquetée (tuple) est renvoyée telle quelle
+    # le cache suppose que les instances ne sont pas modifiées après coup
+    if isinstance(instance, tuple):
+        return instance
+    key = id(instance)
+    if key in _packed_instances and _packed_instances[key][0] is instance:
+        return _packed_instances[key][1]
+    packed = pack_examples(instance)
+
+    if len(_packed_instances) >= MAX_PACKED_INSTANCES:
+        del _packed_instances[next(iter(_packed_instances))]
+    _packed_instances[key] = (instance, packed)
+    return packed
+
+def unpack_instance(packed):
+    # forme liste [nb_bits, (entrées, y), ...] d'une instance empaquetée
+    nb_bits, nb_lanes, inputs, y = packed
+    lanes = [unpack_lanes(column, nb_bits, nb_lanes) for column in inputs]
+    return [nb_bits] + [(list(input), y_k) for input, y_k in zip(zip(*lanes), unpack_lanes(y, nb_bits, nb_lanes))]
+
+def list_instance(instance):
+    # forme liste, reconstruite une seule fois si l'instance est donnée empaquetée
+    if not isinstance(instance, tuple):
+        return instance
+    key = id(instance)
+    if key in _listed_instances and _listed_instances[key][0] is instance:
+        return _listed_instances[key][1]
+    listed = unpack_instance(instance)
+
+    if len(_listed_instances) >= MAX_PACKED_INSTANCES:
+        del _listed_instances[next(iter(_listed_instances))]
+    _listed_instances[key] = (instance, listed)
+    return listed
+
+def bit_not(n, nb_bits, nb_lanes = 1):
+    return lane_mask((1 << nb_bits) - 1, nb_bits, nb_lanes) ^ n
 
-def shift(n, m, nb_bits, shift):
-    if shift == "<<":
-        return (n << m) & ((1 << nb_bits) - 1)
-    elif shift == ">>":
-        return n >> m
+def shift(n, m, nb_bits, shift, nb_lanes = 1):
+    # les masques empêchent les bits de passer d'une voie à l'autre
+    full = (1 << nb_bits) - 1
+    if shift == SHL:
+        return (n << m) & lane_mask(full & ~((1 << m) - 1), nb_bits, nb_lanes)
+    elif shift == SHR:
+        return (n >> m) & lane_mask(full >> m, nb_bits, nb_lanes)
     else:
         raise ValueError
     
 def hamming_weight(n):
-    result = 0
-    while n:
-        result += 1
-        n &= n-1
-    return result
-
-def calcul_gate(children_result, value, input, nb_bits):
-    arity = len(children_result)
-    if arity == 0:
-        return input[value]
-    elif arity == 1:
-        result = children_result[0]
-        if value == "not":
-            return bit_not(result, nb_bits)
-        if value == "id":
-            return result
-        if value[:2] in ["<<", ">>"]:
-            m = int(value[2:])
-            return shift(result, m, nb_bits, value[:2])
-    elif arity == 2:
-        result1 = children_result[0]
-        result2 = children_result[1]
-        if value == "or":
-            return result1 | result2
-        if value == "and":
-            return result1 & result2
-        if value == "xor":
-            return result1 ^ result2
+    return n.bit_count()
+
+# Table de dispatch indexée par la famille de la porte (gates.GATE_KIND)
+def gate_id(children_result, m, nb_bits, nb_lanes):
+    return children_result[0]
+
+def gate_not(children_result, m, nb_bits, nb_lanes):
+    return bit_not(children_result[0], nb_bits, nb_lanes)
+
+def gate_and(children_result, m, nb_bits, nb_lanes):
+    return children_result[0] & children_result[1]
+
+def gate_or(children_result, m, nb_bits, nb_lanes):
+    return children_result[0] | children_result[1]
 
+def gate_xor(children_result, m, nb_bits, nb_lanes):
+    return children_result[0] ^ children_result[1]
+
+def gate_shl(children_result, m, nb_bits, nb_lanes):
+    return shift(children_result[0], m, nb_bits, SHL, nb_lanes)
+
+def gate_shr(children_result, m, nb_bits, nb_lanes):
+    return shift(children_result[0], m, nb_bits, SHR, nb_lanes)
+
+GATE_FUNCTIONS = [gate_id, gate_not, gate_and, gate_or, gate_xor, gate_shl, gate_shr]
+
+def calcul_gate(children_result, value, input, nb_bits, nb_lanes = 1):
+    if not children_result:
+        return input[value]
+    return GATE_FUNCTIONS[GATE_KIND[value]](children_result, SHIFT_AMOUNT[value], nb_bits, nb_lanes)
@@ -0,0 +1,50 @@
+from bitvector_tools import lane_mask
+from gates import GATE_KIND, SHIFT_AMOUNT, ID, NOT, AND, OR, XOR, SHL
+from collections import OrderedDict
+
+COMPILE_CACHE_SIZE = 4096
+_compiled_formulas = OrderedDict()
+
+def formula_to_expression(node):
+    arity = len(node.children)
+    value = node.value
+    if arity == 0:
+        return f"x{value}"
+    kind = GATE_KIND[value]
+    if arity == 1:
+        inner = formula_to_expression(node.children[0])
+        if kind == ID:
+            return inner
+        if kind == NOT:
+            return f"({inner} ^ M)"
+        m = SHIFT_AMOUNT[value]
+        if kind == SHL:
+            return f"(({inner} << {m}) & L{m})"
+        return f"(({inner} >> {m}) & R{m})"
+    left = formula_to_expression(node.children[0])
+    right = formula_to_expression(node.children[1])
+    operator = {AND: "&", OR: "|", XOR: "^"}[kind]
+    return f"({left} {operator} {right})"
+
+def compile_expression(expression, n, nb_bits, nb_lanes = 1):
+    # M, L{m} et R{m} sont les masques du not et des décalages, répétés sur chaque voie
+    full = (1 << nb_bits) - 1
+    namespace = {"M": lane_mask(full, nb_bits, nb_lanes)}
+    for m in range(1, nb_bits + 1):
+        namespace[f"L{m}"] = lane_mask(full & ~((1 << m) - 1), nb_bits, nb_lanes)
+        namespace[f"R{m}"] = lane_mask(full >> m, nb_bits, nb_lanes)
+    variables = ", ".join(f"x{i}" for i in range(n))
+    return eval(f"lambda {variables}: {expression}", namespace)
+
+def compile_formula(formula, n, nb_bits, nb_lanes = 1):
+    # cache LRU indexé par la seed : une formule déjà vue n'est pas recompilée
+    key = (formula.get_seed(), n, nb_bits, nb_lanes)
+    if key in _compiled_formulas:
+        _compiled_formulas.move_to_end(key)
+        return _compiled_formulas[key]
+
+    compiled = compile_expression(formula_to_expression(formula), n, nb_bits, nb_lanes)
+    _compiled_formulas[key] = compiled
+    if len(_compiled_formulas) > COMPILE_CACHE_SIZE:
+        _compiled_formulas.popitem(last=False)
+    return compiled
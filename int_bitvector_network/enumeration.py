@@ -0,0 +1,110 @@
+from softmax_node import SoftmaxNode as Node
+from bitvector_tools import pack_instance, bit_not, shift
+from gates import GATES, GATE_KIND, SHIFT_AMOUNT, NOT, SHL, SHR, AND, OR, XOR, shift_opcode
+
+# Synthèse énumérative ascendante : les formules sont construites par taille
+# croissante et évaluées sur toute l'instance empaquetée. Deux formules de même
+# signature (sorties sur l'instance) sont équivalentes pour le score, on ne garde
+# que la première rencontrée, donc la plus petite.
+
+# nombre maximal de signatures distinctes conservées ; au-delà l'énumération est
+# interrompue et n'est plus exhaustive
+MAX_SIGNATURES = 200000
+
+def unary_candidates(nb_bits):
+    # id ne change pas la signature, il est inutile de l'énumérer
+    gates = [NOT]
+    gates += [shift_opcode(SHL, m) for m in range(1, nb_bits + 1)]
+    gates += [shift_opcode(SHR, m) for m in range(1, nb_bits + 1)]
+    return gates
+
+def calcul_signature(gate, signature, nb_bits, nb_lanes):
+    kind = GATE_KIND[gate]
+    if kind == NOT:
+        return bit_not(signature, nb_bits, nb_lanes)
+    return shift(signature, SHIFT_AMOUNT[gate], nb_bits, kind, nb_lanes)
+
+def build_formula(expression):
+    # expression : (valeur, sous-expressions...) telle que stockée par l'énumération
+    node = Node(expression[0])
+    for child in expression[1:]:
+        node.add_child(build_formula(child))
+    return node
+
+def enumerate_formulas(packed, n, max_size, target = None, max_signatures = MAX_SIGNATURES):
+    # renvoie {signature: expression}, {signature: taille} pour les formules de
+    # taille <= max_size, et complete : faux si max_signatures a interrompu
+    # l'énumération. On s'arrête aussi dès que la signature target est atteinte
+    nb_bits, nb_lanes, inputs, y = packed
+    seen = {}
+    sizes = {}
+    banks = {}
+
+    def add(signature, expression, size):
+        if signature in seen:
+            return False
+        seen[signature] = expression
+        sizes[signature] = size
+        banks[size].append(signature)
+        return signature == target or len(seen) >= max_signatures
+
+    for size in range(1, max_size + 1):
+        banks[size] = []
+        if size == 1:
+            for i in range(n):
+                if add(inputs[i], (i,), size):
+                    return seen, sizes, len(seen) < max_signatures
+            continue
+
+        for gate in unary_candidates(nb_bits):
+            for signature in banks[size - 1]:
+                new_signature = calcul_signature(gate, signature, nb_bits, nb_lanes)
+                if add(new_signature, (gate, seen[signature]), size):
+                    return seen, sizes, len(seen) < max_signatures
+
+        # portes binaires commutatives : taille gauche <= taille droite suffit
+        for left in range(1, (size - 1)//2 + 1):
+            right = size - 1 - left
+            for k, signature1 in enumerate(banks[left]):
+                expression1 = seen[signature1]
+                start = k if left == right else 0
+                for signature2 in banks[right][start:]:
+                    expression2 = seen[signature2]
+                    for gate in GATES[2]:
+                        if gate == AND:
+                            new_signature = signature1 & signature2
+                        elif gate == OR:
+                            new_signature = signature1 | signature2
+                        else:
+                            new_signature = signature1 ^ signature2
+                        if add(new_signature, (gate, expression1, expression2), size):
+                            return seen, sizes, len(seen) < max_signatures
+    return seen, sizes, True
+
+def split_target(seen, sizes, target, max_size, nb_bits, nb_lanes):
+    # cherche target = not(a) ou a xor b avec a et b déjà énumérées,
+    # ce qui atteint des tailles bien plus grandes que l'énumération elle-même
+    not_target = bit_not(target, nb_bits, nb_lanes)
+    if not_target in seen and sizes[not_target] < max_size:
+        return (NOT, seen[not_target])
+    for signature, size in sizes.items():
+        other = signature ^ target
+        if other in seen and size + sizes[other] < max_size:
+            return (XOR, seen[signature], seen[other])
+    return None
+
+def enumerative_search(instance, n, size, nb_bits):
+    # renvoie (formule, score, complete) ; si complete est vrai, la formule est la
+    # meilleure de taille <= size, sinon seulement la meilleure des formules énumérées
+    packed = pack_instance(instance)
+    nb_bits, nb_lanes, inputs, y = packed
+    seen, sizes, complete = enumerate_formulas(packed, n, size, y)
+    if y in seen:
+        return build_formula(seen[y]), 1.0, complete
+    expression = split_target(seen, sizes, y, size, nb_bits, nb_lanes)
+    if expression is not None:
+        return build_formula(expression), 1.0, complete
+
+    best_signature = min(seen, key=lambda signature: (signature ^ y).bit_count())
+    score = nb_lanes*nb_bits - (best_signature ^ y).bit_count()
+    return build_formula(seen[best_signature]), score / (nb_lanes*nb_bits), complete
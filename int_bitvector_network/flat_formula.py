@@ -0,0 +1,269 @@
+from softmax_node import SoftmaxNode, DEFAULT_TAU, softmax_weights
+from init_functions import recreate_formula
+from bitvector_tools import bit_not, shift, pack_instance
+from gates import GATE_KIND, GATE_ARITY, SHIFT_AMOUNT, ID, NOT, AND, OR, XOR, SHL, SHR, candidate_gates, value_name
+from bisect import bisect_left
+from itertools import accumulate
+import random
+
+# Formule stockée en ordre postfixe dans des tableaux parallèles :
+# ops[i] est le code de la porte du noeud i (VAR pour une feuille), args[i] l'indice
+# de la variable ou la taille du décalage, left[i] et right[i] les indices des
+# enfants (-1 si absent). Les enfants sont toujours avant leur parent, la racine
+# est le dernier noeud.
+
+VAR = -1
+
+_candidate_tables = {}
+
+def value_to_op(value, arity):
+    if arity == 0:
+        return VAR, value
+    return value, SHIFT_AMOUNT[value]
+
+def op_to_value(op, arg):
+    if op == VAR:
+        return arg
+    return op
+
+def op_arity(op):
+    if op == VAR:
+        return 0
+    return GATE_ARITY[op]
+
+def candidate_table(arity, n, nb_bits):
+    key = (arity, n, nb_bits)
+    if key not in _candidate_tables:
+        table = [value_to_op(gate, arity) for gate in candidate_gates(arity, nb_bits, n)]
+        _candidate_tables[key] = table
+    return _candidate_tables[key]
+
+def calcul_op(op, arg, result1, result2, input, nb_bits, nb_lanes):
+    if op == VAR:
+        return input[arg]
+    kind = GATE_KIND[op]
+    if kind == ID:
+        return result1
+    if kind == NOT:
+        return bit_not(result1, nb_bits, nb_lanes)
+    if kind == SHL or kind == SHR:
+        return shift(result1, arg, nb_bits, kind, nb_lanes)
+    if kind == AND:
+        return result1 & result2
+    if kind == OR:
+        return result1 | result2
+    if kind == XOR:
+        return result1 ^ result2
+    raise ValueError
+
+class FlatFormula:
+    def __init__(self, ops, args, left, right, tau = DEFAULT_TAU):
+        self.ops = ops
+        self.args = args
+        self.left = left
+        self.right = right
+        self.tau = tau
+        size = len(ops)
+        self.result = [None]*size
+        self.influence = [0]*size
+        self.target = [0]*size
+        self.candidates = [[] for i in range(size)]
+        self.score = [[] for i in range(size)]
+        self.proba = [[] for i in range(size)]
+        self.moves = []
+        self.flat_scores = []
+        self.nb_evaluated = 0
+        self.nb_skipped = 0
+
+    def __len__(self):
+        return len(self.ops)
+
+    def change_tau(self, tau):
+        self.tau = tau
+
+    def get_seed(self, split_c = " "):
+        seeds = []
+        for i in range(len(self.ops)):
+            seed = value_name(op_to_value(self.ops[i], self.args[i]), op_arity(self.ops[i]))
+            for child in [self.left[i], self.right[i]]:
+                if child != -1:
+                    seed = seed + split_c + str(len(seeds[child])) + split_c + seeds[child]
+            seeds.append(seed + split_c)
+        return seeds[-1]
+
+    def calcul(self, input, nb_bits, nb_lanes = 1):
+        ops, args, left, right, result = self.ops, self.args, self.left, self.right, self.result
+        for i in range(len(ops)):
+            result1 = result[left[i]] if left[i] != -1 else None
+            result2 = result[right[i]] if right[i] != -1 else None
+            result[i] = calcul_op(ops[i], args[i], result1, result2, input, nb_bits, nb_lanes)
+        return result[-1]
+
+    def score_formula(self, instance):
+        nb_bits, nb_input, inputs, y = pack_instance(instance)
+        result = self.calcul(inputs, nb_bits, nb_input)
+        score = nb_input*nb_bits - (y ^ result).bit_count()
+        return score / (nb_input*nb_bits)
+
+    def init_score(self, n, nb_bits):
+        for i in range(len(self.ops)):
+            self.candidates[i] = candidate_table(op_arity(self.ops[i]), n, nb_bits)
+            self.score[i] = [0]*len(self.candidates[i])
+
+    def update_influence_target(self, y, nb_bits, nb_lanes):
+        ops, args, left, right, result = self.ops, self.args, self.left, self.right, self.result
+        influence, target = self.influence, self.target
+        influence[-1] = bit_not(0, nb_bits, nb_lanes)
+        target[-1] = y
+        # ordre postfixe inversé : chaque parent est traité avant ses enfants
+        for i in range(len(ops) - 1, -1, -1):
+            if ops[i] == VAR:
+                continue
+            kind = GATE_KIND[ops[i]]
+            child1, child2 = left[i], right[i]
+            if kind == ID:
+                influence[child1] = influence[i]
+                target[child1] = target[i]
+            elif kind == NOT:
+                influence[child1] = influence[i]
+                target[child1] = bit_not(target[i], nb_bits, nb_lanes)
+            elif kind in [SHL, SHR]:
+                antishift = SHR if kind == SHL else SHL
+                influence[child1] = shift(influence[i], args[i], nb_bits, antishift, nb_lanes)
+                target[child1] = shift(target[i], args[i], nb_bits, antishift, nb_lanes)
+            elif kind == OR:
+                influence[child1] = bit_not(result[child2], nb_bits, nb_lanes) & influence[i]
+                influence[child2] = bit_not(result[child1], nb_bits, nb_lanes) & influence[i]
+                target[child1] = target[i]
+                target[child2] = target[i]
+            elif kind == AND:
+                influence[child1] = result[child2] & influence[i]
+                influence[child2] = result[child1] & influence[i]
+                target[child1] = target[i]
+                target[child2] = target[i]
+            elif kind == XOR:
+                influence[child1] = influence[i]
+                influence[child2] = influence[i]
+                target[child1] = result[child2] ^ target[i]
+                target[child2] = result[child1] ^ target[i]
+
+    def update_tree_score(self, instance):
+        nb_bits, nb_input, inputs, y = pack_instance(instance)
+        self.init_score(len(inputs), nb_bits)
+        self.calcul(inputs, nb_bits, nb_input)
+        self.update_influence_target(y, nb_bits, nb_input)
+
+        ops, args, left, right, result = self.ops, self.args, self.left, self.right, self.result
+        denominator = nb_input*nb_bits
+        self.nb_evaluated = 0
+        self.nb_skipped = 0
+        for i in range(len(ops)):
+            influence, target = self.influence[i], self.target[i]
+            if not influence:
+                # noeud sans influence sur l'instance : tous ses scores sont nuls
+                self.nb_skipped += len(self.candidates[i]) - 1
+                continue
+            self.nb_evaluated += len(self.candidates[i]) - 1
+            result1 = result[left[i]] if left[i] != -1 else None
+            result2 = result[right[i]] if right[i] != -1 else None
+            current_nb_error = ((result[i] ^ target) & influence).bit_count()
+            score = self.score[i]
+            for k, (op, arg) in enumerate(self.candidates[i]):
+                if op == ops[i] and arg == args[i]:
+                    continue
+                new_result = calcul_op(op, arg, result1, result2, inputs, nb_bits, nb_input)
+                nb_error = ((new_result ^ target) & influence).bit_count()
+                score[k] = (current_nb_error - nb_error) / denominator
+        self.collect_scores()
+
+    def collect_scores(self):
+        self.moves = []
+        self.flat_scores = []
+        for i in range(len(self.ops)):
+            for k, (op, arg) in enumerate(self.candidates[i]):
+                if op != self.ops[i] or arg != self.args[i]:
+                    self.moves.append((i, k))
+                    self.flat_scores.append(self.score[i][k])
+
+    def update_tree_proba(self):
+        self.collect_scores()
+        weights = softmax_weights(self.flat_scores, self.tau)
+        total = sum(weights)
+        self.proba = [[0]*len(self.candidates[i]) for i in range(len(self.ops))]
+        for (i, k), weight in zip(self.moves, weights):
+            self.proba[i][k] = weight / total
+
+    def update_tree(self, instance):
+        self.update_tree_score(instance)
+        self.update_tree_proba()
+
+    def cumulative_weights(self):
+        return list(accumulate(softmax_weights(self.flat_scores, self.tau)))
+
+    def apply_move(self, move):
+        # renvoie le mouvement inverse, comme SoftmaxNode.apply_move
+        i, k = move
+        old_k = self.candidates[i].index((self.ops[i], self.args[i]))
+        self.ops[i], self.args[i] = self.candidates[i][k]
+        return i, old_k
+
+    def sample_moves(self, k):
+        if not self.flat_scores:
+            return []
+        return random.choices(self.moves, cum_weights=self.cumulative_weights(), k=k)
+
+    def softmax(self):
+        if not self.flat_scores:
+            return
+        cum_weights = self.cumulative_weights()
+        i = bisect_left(cum_weights, random.random()*cum_weights[-1])
+        return self.apply_move(self.moves[min(i, len(cum_weights) - 1)])
+
+    def penalize(self, moves, penalty):
+        # moves : couples (indice, candidat) à défavoriser, leur poids est divisé par exp(tau*penalty)
+        moves = set(moves)
+        for j, move in enumerate(self.moves):
+            if move in moves:
+                self.flat_scores[j] -= penalty
+
+    def image(self, param = "value"):
+        return flat_to_node(self).image(param)
+
+    def print(self, param = "value"):
+        print(self.image(param))
+
+def node_to_flat(node, tau = DEFAULT_TAU):
+    ops, args, left, right = [], [], [], []
+
+    def visit(node):
+        indices = [visit(child) for child in node.children]
+        op, arg = value_to_op(node.value, len(node.children))
+        ops.append(op)
+        args.append(arg)
+        left.append(indices[0] if len(indices) > 0 else -1)
+        right.append(indices[1] if len(indices) > 1 else -1)
+        return len(ops) - 1
+
+    visit(node)
+    return FlatFormula(ops, args, left, right, tau)
+
+def flat_to_node(flat):
+    nodes = []
+    for i in range(len(flat.ops)):
+        node = SoftmaxNode(op_to_value(flat.ops[i], flat.args[i]), flat.tau)
+        for child in [flat.left[i], flat.right[i]]:
+            if child != -1:
+                node.add_child(nodes[child])
+        node.result = flat.result[i]
+        node.score = {}
+        node.proba = {}
+        for k, (op, arg) in enumerate(flat.candidates[i]):
+            if op != flat.ops[i] or arg != flat.args[i]:
+                node.score[op_to_value(op, arg)] = flat.score[i][k]
+                if flat.proba[i]:
+                    node.proba[op_to_value(op, arg)] = flat.proba[i][k]
+        nodes.append(node)
+    return nodes[-1]
+
+def recreate_flat_formula(seed, tau = DEFAULT_TAU):
+    return node_to_flat(recreate_formula(seed), tau)
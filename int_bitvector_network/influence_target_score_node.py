@@ -1,49 +1,69 @@
-from node import Node, GATES
-from bitvector_tools import hamming_weight, bit_not, calcul_gate, shift
+from node import Node
+from gates import GATE_KIND, SHIFT_AMOUNT, ID, NOT, AND, OR, XOR, SHL, SHR, candidate_gates
+from bitvector_tools import hamming_weight, bit_not, calcul_gate, shift, pack_instance
+from compile_formula import compile_formula
+from threads import nb_threads, thread_map
+
+# évaluation dans score_formula :
+# "tree" parcourt tout l'arbre, "compiled" appelle la formule compilée,
+# "incremental" ne recalcule que les noeuds modifiés depuis la dernière évaluation
+EVAL_MODE = "incremental"
 
 class InfluenceTargetScoreNode(Node):
+    __slots__ = ("influence", "target", "nb_evaluated", "nb_skipped", "score_value")
+
     def __init__(self, value = None):
         super().__init__(value)
         self.influence = None
         self.target = None
-        self.new_influence = None
+        # valeur du noeud pour laquelle les clés de self.score ont été construites
+        self.score_value = None
+        # nombre de portes candidates évaluées / ignorées au dernier update_tree_score
+        self.nb_evaluated = 0
+        self.nb_skipped = 0
+
+    def replace_subtree(self, other):
+        super().replace_subtree(other)
+        self.score_value = None
 
     def score_formula(self, instance):
-        score = 0
-        nb_input = len(instance) - 1
-        nb_bits = instance[0]
-        for input, y in instance[1:]:
-            result = self.calcul(input, nb_bits)
-            score += hamming_weight(bit_not(y ^ result, nb_bits))
+        nb_bits, nb_input, inputs, y = pack_instance(instance)
+        if EVAL_MODE == "compiled":
+            result = compile_formula(self, len(inputs), nb_bits, nb_input)(*inputs)
+        elif EVAL_MODE == "incremental":
+            result = self.calcul_incremental(inputs, nb_bits, nb_input)
+        else:
+            result = self.calcul(inputs, nb_bits, nb_input)
+        score = nb_input*nb_bits - (y ^ result).bit_count()
         return score / (nb_input*nb_bits)
 
     def update_tree_score(self, instance):
-        nb_bits = instance[0]
-        n = len(instance[1][0])
-        self.influence = (1 << nb_bits) - 1
-        nb_input = len(instance) - 1
-        self.init_score(n, nb_bits)
-        for input, y in instance[1:]:
-            self.target = y
-            self.calcul(input, nb_bits)
-            self.update_influence_target(nb_bits)
-            self.update_score(input, y, nb_bits)
+        # une seule passe sur l'instance entière, chaque exemple occupe une voie de nb_bits bits
+        nb_bits, nb_input, inputs, y = pack_instance(instance)
+        self.influence = bit_not(0, nb_bits, nb_input)
+        self.target = y
+        self.init_score(len(inputs), nb_bits)
+        self.calcul_incremental(inputs, nb_bits, nb_input)
+        self.update_influence_target(nb_bits, nb_input)
+        if nb_threads() > 1:
+            self.nb_evaluated, self.nb_skipped = self.update_score_threads(inputs, y, nb_bits, nb_input)
+        else:
+            self.nb_evaluated, self.nb_skipped = self.update_score(inputs, y, nb_bits, nb_input)
         self.finish_score(nb_input*nb_bits)
 
     def init_score(self, n, nb_bits):
-        arity = len(self.children)
-        self.score = {}
-        l_gates = list(range(n))
-        if arity == 1:
-            l_gates = ["id", "not"]
-            l_gates += ["<<" + str(i) for i in range(1, nb_bits + 1)]
-            l_gates += [">>" + str(i) for i in range(1, nb_bits + 1)]
-        if arity == 2:
-            l_gates = GATES[arity]
-
-        for gate in l_gates:
-            if gate != self.value:
+        # le dictionnaire est réutilisé d'une itération à l'autre, il n'est
+        # reconstruit que si la porte du noeud ou les candidats ont changé
+        candidates = candidate_gates(len(self.children), nb_bits, n)
+        if self.score_value == self.value and len(self.score) == len(candidates) - 1:
+            for gate in self.score:
                 self.score[gate] = 0
+        else:
+            self.score.clear()
+            for gate in candidates:
+                if gate != self.value:
+                    self.score[gate] = 0
+            self.score_value = self.value
 
         for child in self.children:
             child.init_score(n, nb_bits)
@@ -54,61 +74,92 @@ class InfluenceTargetScoreNode(Node):
         for child in self.children:
             child.finish_score(denominator)
     
-    def update_score(self, input, y, nb_bits):
-        
-        current_nb_match = hamming_weight(bit_not(self.result ^ self.target, nb_bits) & self.influence)
+    def count_candidates(self):
+        return len(self.score) + sum(child.count_candidates() for child in self.children)
 
-        for gate in self.score:
-            children_result = [child.result for child in self.children]
-            result = calcul_gate(children_result, gate, input, nb_bits)
-            nb_match = hamming_weight(bit_not(result ^ self.target, nb_bits) & self.influence)
-
-            self.score[gate] += nb_match - current_nb_match
+    def score_candidates(self, input, nb_bits, nb_lanes = 1):
+        # ne lit que les résultats des enfants et n'écrit que self.score :
+        # une fois influence et target calculées, les noeuds sont indépendants
+        children_result = [child.result for child in self.children]
+        current_nb_error = hamming_weight((self.result ^ self.target) & self.influence)
 
+        for gate in self.score:
+            result = calcul_gate(children_result, gate, input, nb_bits, nb_lanes)
+            nb_error = hamming_weight((result ^ self.target) & self.influence)
+
+            self.score[gate] += current_nb_error - nb_error
+
+    def update_score_threads(self, input, y, nb_bits, nb_lanes = 1):
+        # même résultat que update_score, les noeuds étant répartis sur les threads
+        nodes, nb_skipped = [], 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not node.influence:
+                nb_skipped += node.count_candidates()
+                continue
+            nodes.append(node)
+            stack.extend(node.children)
+        thread_map(lambda node: node.score_candidates(input, nb_bits, nb_lanes), nodes)
+        return sum(len(node.score) for node in nodes), nb_skipped
+
+    def update_score(self, input, y, nb_bits, nb_lanes = 1):
+        # influence nulle sur toute l'instance : rien dans ce sous-arbre ne change le score,
+        # les scores restent à 0 et on renvoie le nombre de candidats ignorés
+        if not self.influence:
+            return 0, self.count_candidates()
+
+        self.score_candidates(input, nb_bits, nb_lanes)
+
+        nb_evaluated, nb_skipped = len(self.score), 0
         for child in self.children:
-            child.update_score(input, y, nb_bits)
+            child_evaluated, child_skipped = child.update_score(input, y, nb_bits, nb_lanes)
+            nb_evaluated += child_evaluated
+            nb_skipped += child_skipped
+        return nb_evaluated, nb_skipped
 
 
-    def update_influence_target(self, nb_bits):
+    def update_influence_target(self, nb_bits, nb_lanes = 1):
         arity = len(self.children)
-        antishift = {"<<":">>", ">>":"<<"}
+        antishift = {SHL: SHR, SHR: SHL}
 
         if arity == 0:
             return
+        kind = GATE_KIND[self.value]
         if arity == 1:
             child = self.children[0]
-            if self.value == "id":
+            if kind == ID:
                 child.influence = self.influence
                 child.target = self.target
-            if self.value == "not":
+            if kind == NOT:
                 child.influence = self.influence
-                child.target = bit_not(self.target, nb_bits)
-            if self.value[:2] in ["<<", ">>"]:
-                m = int(self.value[2:])
-                child.influence = shift(self.influence, m, nb_bits, antishift[self.value[:2]])
-                child.target = shift(self.target, m, nb_bits, antishift[self.value[:2]])
-            child.update_influence_target(nb_bits)
+                child.target = bit_not(self.target, nb_bits, nb_lanes)
+            if kind in [SHL, SHR]:
+                m = SHIFT_AMOUNT[self.value]
+                child.influence = shift(self.influence, m, nb_bits, antishift[kind], nb_lanes)
+                child.target = shift(self.target, m, nb_bits, antishift[kind], nb_lanes)
+            child.update_influence_target(nb_bits, nb_lanes)
 
         if arity == 2:
             child1 = self.children[0]
             child2 = self.children[1]
-            assert self.value in GATES[2]
-            if self.value == "or":
-                child1.influence = bit_not(child2.result, nb_bits) & self.influence
-                child2.influence = bit_not(child1.result, nb_bits) & self.influence
+            assert kind in [AND, OR, XOR]
+            if kind == OR:
+                child1.influence = bit_not(child2.result, nb_bits, nb_lanes) & self.influence
+                child2.influence = bit_not(child1.result, nb_bits, nb_lanes) & self.influence
                 child1.target = self.target
                 child2.target = self.target
-            if self.value == "and":
+            if kind == AND:
                 child1.influence = child2.result & self.influence
                 child2.influence = child1.result & self.influence
                 child1.target = self.target
                 child2.target = self.target
-            if self.value == "xor":
+            if kind == XOR:
                 child1.influence = self.influence
                 child2.influence = self.influence
-                child1.target = (child2.result & bit_not(self.target, nb_bits)) | (bit_not(child2.result, nb_bits) & self.target)
-                child2.target = (child1.result & bit_not(self.target, nb_bits)) | (bit_not(child1.result, nb_bits) & self.target)
+                child1.target = (child2.result & bit_not(self.target, nb_bits, nb_lanes)) | (bit_not(child2.result, nb_bits, nb_lanes) & self.target)
+                child2.target = (child1.result & bit_not(self.target, nb_bits, nb_lanes)) | (bit_not(child1.result, nb_bits, nb_lanes) & self.target)
 
-            child1.update_influence_target(nb_bits)
-            child2.update_influence_target(nb_bits)
+            child1.update_influence_target(nb_bits, nb_lanes)
+            child2.update_influence_target(nb_bits, nb_lanes)
 
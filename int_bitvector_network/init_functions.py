@@ -1,7 +1,9 @@
 import random
 from softmax_node import SoftmaxNode as Node
-from node import GATES
+from gates import GATES, SHL, SHR, gate_opcode, shift_opcode
 from bitvector_tools import*
+from compile_formula import compile_formula
+from simplify import simplify
 
 def create_rd_formula(n, size, nb_bits):
 
@@ -13,9 +15,9 @@ def create_rd_formula(n, size, nb_bits):
         nb_gate = len(GATES[1])
         i = random.randint(1, nb_gate - 1)
         gate = GATES[1][i]
-        if gate == "<<" or gate == ">>":
+        if gate == SHL or gate == SHR:
             j = random.randint(1, nb_bits)
-            gate = gate + str(j)
+            gate = shift_opcode(gate, j)
         x = random.randint(0, n-1)
         node = Node(gate)
         node.add_child(Node(x))
@@ -53,7 +55,7 @@ def recreate_formula(seed):
     if seed[i:] == "":
         return Node(int(value))
     
-    node = Node(value)
+    node = Node(gate_opcode(value))
     
     while seed[i:] != "":
         j, size = next_token()
@@ -64,12 +66,18 @@ def recreate_formula(seed):
         i += size + 1
     return node
 
+def simplify_seed(seed, nb_bits):
+    # seed de la forme canonique : deux formules équivalentes par les règles de simplify ont la même
+    return simplify(recreate_formula(seed), nb_bits).get_seed()
+
 def derive_instance(n, nb_examples, formula, nb_bits):
     assert nb_examples <= 1 << (n*nb_bits)
     instance = [nb_bits]
+    # la forme simplifiée est moins chère à évaluer, et les formules équivalentes partagent leur compilation
+    f = compile_formula(simplify(formula, nb_bits), n, nb_bits)
     for i in range(nb_examples):
         input = [random.randint(0, 2**nb_bits-1) for i in range(n)]
-        y = formula.calcul(input, nb_bits)
+        y = f(*input)
         instance.append((input, y))
 
     return instance
@@ -0,0 +1,231 @@
+from examples import extract_examples
+from algorithms import get_algo
+from results import instance_seed, write_scores
+from multiprocessing import Process
+from threading import Thread, Event
+from time import time, sleep
+from uuid import uuid4
+import socket
+import random
+import os
+
+# File de jobs sur un système de fichiers partagé, pour répartir un benchmark
+# sur plusieurs machines. Un job est une plage d'instances d'un fichier de
+# benchmark pour un algorithme (nom de main.py / get_algo). Dans queue_dir :
+#   jobs/<job>.job       description du job
+#   leases/<job>.lock    bail, créé avec O_CREAT | O_EXCL : un seul processus le
+#                        prend ; il contient un jeton propre à cette prise, et
+#                        son mtime est rafraîchi par le heartbeat
+#   results/<job>.txt    scores de la plage, écrits puis renommés d'un coup
+# Un bail dont le mtime a plus de LEASE_TIMEOUT secondes est repris par un autre
+# processus. Les graines par instance sont celles de results, donc un job exécuté
+# deux fois (bail repris à tort) écrit deux fois les mêmes scores.
+
+HEARTBEAT_PERIOD = 10
+LEASE_TIMEOUT = 60
+POLL_PERIOD = 5
+JOB_SIZE = 10
+
+def job_paths(queue_dir, job):
+    return (f"{queue_dir}/jobs/{job}.job", f"{queue_dir}/leases/{job}.lock", f"{queue_dir}/results/{job}.txt")
+
+def read_job(queue_dir, job):
+    with open(job_paths(queue_dir, job)[0], "r") as file:
+        algoname, dir_benchmark, filename, start, end, seed = file.read().split("\n")[:6]
+    return algoname, dir_benchmark, filename, int(start), int(end), seed
+
+def count_examples(path):
+    # nombre d'exemples écrit dans l'en-tête par generate_examples
+    with open(path, "r") as file:
+        for i in range(3):
+            file.readline()
+        return int(file.readline())
+
+def submit_jobs(queue_dir, algoname, dir_benchmark, filenames = None, job_size = JOB_SIZE, seed = 0):
+    # un job par plage de job_size instances ; tous les fichiers de dir_benchmark par défaut
+    get_algo(algoname)
+    for sub_dir in ["jobs", "leases", "results"]:
+        os.makedirs(f"{queue_dir}/{sub_dir}", exist_ok=True)
+    if filenames is None:
+        filenames = sorted(os.listdir(dir_benchmark))
+    jobs = []
+    for filename in filenames:
+        nb_examples = count_examples(dir_benchmark + "/" + filename)
+        for start in range(0, nb_examples, job_size):
+            end = min(start + job_size, nb_examples)
+            job = f"{algoname}__{filename.split('.')[0]}__{start:06d}"
+            with open(job_paths(queue_dir, job)[0], "w") as file:
+                file.write("\n".join([algoname, dir_benchmark, filename, str(start), str(end), str(seed)]) + "\n")
+            jobs.append(job)
+    return jobs
+
+def list_jobs(queue_dir, algoname = None):
+    jobs = sorted(name[:-len(".job")] for name in os.listdir(f"{queue_dir}/jobs") if name.endswith(".job"))
+    if algoname is not None:
+        jobs = [job for job in jobs if job.startswith(algoname + "__")]
+    return jobs
+
+def read_token(path):
+    try:
+        with open(path, "r") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+def expired(path, lease_timeout):
+    return time() - os.path.getmtime(path) >= lease_timeout
+
+def try_lock(lock_path, worker_id):
+    # création atomique : renvoie le jeton du bail, propre à cette prise, ou None s'il existe déjà
+    token = f"{worker_id} {uuid4().hex}"
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, "w") as file:
+        file.write(token)
+    return token
+
+def remove_lock(lock_path, worker_id, check):
+    # retire le bail si check(fichier) est vrai sur le bail une fois renommé. Le
+    # renommage est atomique : on teste bien le fichier retiré, et un bail qui ne
+    # passe pas le test (repris entre-temps par un autre processus) est remis en place
+    stale_path = f"{lock_path}.{worker_id}.stale"
+    try:
+        os.rename(lock_path, stale_path)
+    except FileNotFoundError:
+        return False
+    if check(stale_path):
+        os.remove(stale_path)
+        return True
+    try:
+        os.link(stale_path, lock_path)
+    except FileExistsError:
+        # un troisième processus a pris le job pendant ce court instant : le job
+        # tournera deux fois, ce qui ne change pas les résultats
+        pass
+    os.remove(stale_path)
+    return False
+
+def reclaim_expired(lock_path, worker_id, lease_timeout):
+    # le bail n'est retiré que s'il porte encore le jeton lu et n'a pas été rafraîchi :
+    # un bail neuf pris entre la lecture et le renommage n'est pas touché
+    token = read_token(lock_path)
+    try:
+        if token is None or not expired(lock_path, lease_timeout):
+            return False
+    except FileNotFoundError:
+        return False
+    if not remove_lock(lock_path, worker_id, lambda path: read_token(path) == token and expired(path, lease_timeout)):
+        return False
+    print(f"{worker_id} : bail expiré repris {os.path.basename(lock_path)}")
+    return True
+
+def claim_job(queue_dir, worker_id, lease_timeout = LEASE_TIMEOUT):
+    # renvoie (job pris, jeton du bail, nombre de jobs non terminés), job et jeton à None si aucun
+    nb_remaining = 0
+    for job in list_jobs(queue_dir):
+        job_path, lock_path, result_path = job_paths(queue_dir, job)
+        if os.path.exists(result_path):
+            continue
+        nb_remaining += 1
+        token = try_lock(lock_path, worker_id)
+        if token is None and reclaim_expired(lock_path, worker_id, lease_timeout):
+            token = try_lock(lock_path, worker_id)
+        if token is not None:
+            # le job a pu être terminé (résultat écrit, puis bail retiré) depuis le test ci-dessus
+            if not os.path.exists(result_path):
+                return job, token, nb_remaining
+            remove_lock(lock_path, worker_id, lambda path: read_token(path) == token)
+            nb_remaining -= 1
+    return None, None, nb_remaining
+
+def heartbeat(lock_path, token, stop, period):
+    # ne rafraîchit que son propre bail ; il peut manquer un instant pendant un
+    # remove_lock d'un autre processus qui le remet ensuite en place
+    while not stop.wait(period):
+        try:
+            if read_token(lock_path) == token:
+                os.utime(lock_path)
+        except FileNotFoundError:
+            pass
+
+def run_job(queue_dir, job, worker_id, token, examples_cache, heartbeat_period = HEARTBEAT_PERIOD):
+    algoname, dir_benchmark, filename, start, end, seed = read_job(queue_dir, job)
+    job_path, lock_path, result_path = job_paths(queue_dir, job)
+    params_str = (filename.split(".")[0]).split("_")
+    n, nb_bits, size = [int(param) for param in params_str]
+    path = dir_benchmark + "/" + filename
+    if path not in examples_cache:
+        # les jobs sont triés par fichier, on ne garde que le dernier lu
+        examples_cache.clear()
+        examples_cache[path] = extract_examples(path)
+    examples = examples_cache[path]
+
+    stop = Event()
+    thread = Thread(target=heartbeat, args=(lock_path, token, stop, heartbeat_period), daemon=True)
+    thread.start()
+    try:
+        algo = get_algo(algoname)
+        lines = []
+        for num_exemple in range(start, end):
+            random.seed(instance_seed(seed, filename, num_exemple))
+            formula, instance = examples[num_exemple]
+            score = algo(instance, n, size, nb_bits)
+            lines.append(f"{num_exemple} {score!r}\n")
+    finally:
+        stop.set()
+        thread.join()
+
+    tmp_path = f"{result_path}.{worker_id}.tmp"
+    with open(tmp_path, "w") as file:
+        file.writelines(lines)
+    os.replace(tmp_path, result_path)
+    # si le bail a été repris, il appartient à un autre processus
+    remove_lock(lock_path, worker_id, lambda path: read_token(path) == token)
+
+def run_worker(queue_dir, worker_id = None, lease_timeout = LEASE_TIMEOUT, heartbeat_period = HEARTBEAT_PERIOD, poll_period = POLL_PERIOD):
+    # prend des jobs jusqu'à ce qu'ils soient tous terminés ; attend tant que
+    # d'autres processus en détiennent, pour reprendre leurs baux s'ils meurent
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}_{os.getpid()}"
+    examples_cache = {}
+    while True:
+        job, token, nb_remaining = claim_job(queue_dir, worker_id, lease_timeout)
+        if job is not None:
+            print(f"{worker_id} : {job}")
+            run_job(queue_dir, job, worker_id, token, examples_cache, heartbeat_period)
+        elif nb_remaining == 0:
+            return
+        else:
+            sleep(poll_period)
+
+def run_local_workers(queue_dir, nb_workers = None, **kwargs):
+    # nb_workers processus locaux à la place de nb_workers machines
+    if nb_workers is None:
+        nb_workers = os.cpu_count()
+    workers = [Process(target=run_worker, args=(queue_dir,), kwargs=kwargs) for i in range(nb_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+def merge_results(queue_dir, algoname, result_file, nb_instances):
+    # même format que result_benchmark, un bloc par fichier de benchmark
+    scores = {}
+    for job in list_jobs(queue_dir, algoname):
+        filename = read_job(queue_dir, job)[2]
+        result_path = job_paths(queue_dir, job)[2]
+        if not os.path.exists(result_path):
+            raise ValueError(f"job non terminé : {job}")
+        with open(result_path, "r") as file:
+            for line in file:
+                num_exemple, score = line.split()
+                scores.setdefault(filename, {})[int(num_exemple)] = float(score)
+
+    s = "------------ RESULTS ------------\n\n"
+    with open(result_file, "w") as file:
+        file.write(s)
+        for filename in sorted(scores):
+            file.write(filename+"\n\n")
+            write_scores(file, [scores[filename][k] for k in range(len(scores[filename]))], nb_instances)
@@ -1,43 +1,18 @@
-from node import Node, GATES
+from naive_score_node import NaiveScoreNode
+from bitvector_tools import list_instance
+
+class LessNaiveScoreNode(NaiveScoreNode):
+    __slots__ = ()
 
-class LessNaiveScoreNode(Node):
     def __init__(self, value = None):
         super().__init__(value)
 
-    def score_formula(self, instance):
+    def score_with(self, instance, node, value):
+        # proportion de bits justes plutôt que d'exemples justes
+        instance = list_instance(instance)
         score = 0
-        n = len(instance)
-        nb_bits = len(instance[0][0][0])
-        for input, y in instance:
-            result = self.calcul(input)
-            for i in range(nb_bits):
-                if result[i] == y[i]:
-                    score += 1
-        return score / (n*nb_bits)
-
-    def update_tree_score(self, instance):
-        self.update_score(instance, self, self.score_formula(instance))
-    
-    def update_score(self, instance, root, score):
-        arity = len(self.children)
-        n = len(instance[0][0])
-        nb_bits = len(instance[0][0][0])
-        current_value = self.value
-        self.score = {}
-        l_gates = list(range(n))
-        if arity == 1:
-            l_gates = ["id", "not"]
-            l_gates += ["<<" + str(i) for i in range(1, nb_bits + 1)]
-            l_gates += [">>" + str(i) for i in range(1, nb_bits + 1)]
-        if arity == 2:
-            l_gates = GATES[arity]
-
-        for i in l_gates:
-            if i != current_value:
-                self.value = i
-                self.score[i] = root.score_formula(instance) - score
-        self.value = current_value
-
-        for child in self.children:
-            child.update_score(instance, root, score)
-
+        nb_bits = instance[0]
+        for input, y in instance[1:]:
+            result = self.calcul_with(node, value, input, nb_bits)
+            score += nb_bits - (result ^ y).bit_count()
+        return score / ((len(instance) - 1)*nb_bits)
@@ -1,20 +1,31 @@
 from results import*
 from treat_results import*
 from algorithms import*
+from job_queue import submit_jobs, run_local_workers, merge_results
+from simplify import simplify
+from less_naive_score_node import LessNaiveScoreNode
+from numpy_score_node import NumpyScoreNode
+import threads
 from time import time
+import gc
+import tracemalloc
+import os
 
 def test_evolution(n, size, nb_bits, progressive = True):
     node = create_rd_formula(n, size, nb_bits)
     instance, goal = create_rd_instance(n, size, 2**(n-1), nb_bits)
     score = 0
+    stats = {}
     if progressive:
-        score = progressive_evolution(node, instance, 1000)
+        score = progressive_evolution(node, instance, 1000, stats=stats)
     else:
-        score = evolution(node, instance, tau =20, N=1000)
+        score = evolution(node, instance, tau =20, N=1000, stats=stats, cache=ScoreCache())
     goal.print()
     node.print()
     node.print("score")
+    simplify(node, nb_bits).print()
     print(score)
+    print_stats(stats)
 
 def test_seed(n, size, nb_bits):
     node = create_rd_formula(n, size, nb_bits)
@@ -30,26 +41,111 @@ def test_examples():
 
 def test_example_file(algoname, filename, nb_instances, dir_benchmark):
     result_file = "result_" + algoname + "_of_" + filename
-    try:
-        i = L_ALGO_STR.index(algoname)
-        result_example_file(L_ALGO[i], result_file, filename, nb_instances, dir_benchmark)
-    except ValueError:
-        if algoname.startswith("algo_softmax"):
-            n = len("algo_softmax")
-            tau, N, progressive = [int(param) for param in algoname[n:].split("_")]
-            result_example_file(algo_softmax(tau, N, progressive), result_file, filename, nb_instances, dir_benchmark)
+    result_example_file(get_algo(algoname), result_file, filename, nb_instances, dir_benchmark)
 
 def test_benchmark(algoname, nb_instances, dir_benchmark):
     result_file = "result_" + algoname + ".txt"
-    try:
-        i = L_ALGO_STR.index(algoname)
-        result_benchmark(L_ALGO[i], result_file, nb_instances, dir_benchmark)
-    except ValueError:
-        if algoname.startswith("algo_softmax"):
-            n = len("algo_softmax")
-            tau, N, progressive = [int(param) for param in algoname[n:].split("_")]
-            result_benchmark(algo_softmax(tau, N, progressive), result_file, nb_instances, dir_benchmark)
+    result_benchmark(get_algo(algoname), result_file, nb_instances, dir_benchmark)
+
+def test_example_file_parallel(algoname, filename, nb_instances, dir_benchmark, nb_workers = None):
+    result_file = "result_" + algoname + "_of_" + filename
+    parallel_result_example_file(algoname, result_file, filename, nb_instances, dir_benchmark, nb_workers)
 
+def test_benchmark_parallel(algoname, nb_instances, dir_benchmark, nb_workers = None):
+    result_file = "result_" + algoname + ".txt"
+    parallel_result_benchmark(algoname, result_file, nb_instances, dir_benchmark, nb_workers)
+
+def test_benchmark_queue(algoname, nb_instances, dir_benchmark, queue_dir = "queue", nb_workers = None):
+    # sur plusieurs machines : submit_jobs une fois, job_queue.run_worker(queue_dir)
+    # sur chacune (queue_dir et dir_benchmark partagés), puis merge_results
+    result_file = "result_" + algoname + ".txt"
+    submit_jobs(queue_dir, algoname, dir_benchmark)
+    run_local_workers(queue_dir, nb_workers)
+    merge_results(queue_dir, algoname, result_file, nb_instances)
+
+def benchmark_memory(algoname, filename, dir_benchmark, trace = True):
+    # pic mémoire (tracemalloc) et temps passé dans le ramasse-miettes sur un fichier de benchmark
+    gc_time = [0, 0]
+    def gc_callback(phase, info):
+        if phase == "start":
+            gc_time[1] = time()
+        else:
+            gc_time[0] += time() - gc_time[1]
+
+    algo = get_algo(algoname)
+    params_str = (filename.split(".")[0]).split("_")
+    n, nb_bits, size = [int(param) for param in params_str]
+    examples = extract_examples(dir_benchmark + "/" + filename)
+
+    gc.callbacks.append(gc_callback)
+    if trace:
+        tracemalloc.start()
+    t0 = time()
+    for formula, instance in examples:
+        algo(instance, n, size, nb_bits)
+    total_time = time() - t0
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"Pic mémoire : {peak // 1024} Kio")
+    gc.callbacks.remove(gc_callback)
+    print(f"Temps total : {round(total_time, 2)} s, dont ramasse-miettes : {round(1000*gc_time[0], 1)} ms")
+
+def benchmark_threads(n, size, nb_bits, nb_examples, l_nb_threads = [1, 2, 4, 8], nb_repeats = 10):
+    # temps d'un update_tree_score selon le nombre de threads, pour le scoreur
+    # influence/target et pour le re-scoring complet de LessNaiveScoreNode ;
+    # NumpyScoreNode, qui n'utilise pas de threads, est mesuré une fois avant
+    print(f"GIL désactivé : {threads.gil_disabled()}")
+    instance, goal = create_rd_instance(n, size, nb_examples, nb_bits)
+    formula = create_rd_formula(n, size, nb_bits)
+    naive = recreate_as(formula, LessNaiveScoreNode)
+    # premier appel hors chronomètre : empaquetage de l'instance
+    formula.update_tree_score(instance)
+    try:
+        columnar = recreate_as(formula, NumpyScoreNode)
+        # premier appel hors chronomètre : conversion en colonnes
+        columnar.update_tree_score(instance)
+        t0 = time()
+        for i in range(nb_repeats):
+            columnar.update_tree_score(instance)
+        print(f"numpy (colonnes) : {round(1000*(time() - t0)/nb_repeats, 2)} ms")
+    except ImportError:
+        print("numpy absent, NumpyScoreNode non mesuré")
+    for k in l_nb_threads:
+        threads.NB_THREADS = k
+        t0 = time()
+        for i in range(nb_repeats):
+            formula.update_tree_score(instance)
+        t1 = time()
+        naive.update_tree_score(instance)
+        t2 = time()
+        print(f"{k} threads : influence/target {round(1000*(t1 - t0)/nb_repeats, 2)} ms, re-scoring complet {round(1000*(t2 - t1), 1)} ms")
+    threads.NB_THREADS = None
+
+def benchmark_restarts(filename, dir_benchmark, nb_instances, l_nb_workers = [1, 2, 4]):
+    # temps réel et nombre d'instances résolues : die_retry en série, puis
+    # parallel_die_retry (un pool créé par instance) selon le nombre de processus
+    params_str = (filename.split(".")[0]).split("_")
+    n, nb_bits, size = [int(param) for param in params_str]
+    examples = extract_examples(dir_benchmark + "/" + filename)[:nb_instances]
+    print(f"Processeurs : {os.cpu_count()}")
+    t0 = time()
+    nb_solved = sum(die_retry(instance, n, size, nb_bits)[1] > 0.99 for formula, instance in examples)
+    print(f"série : {nb_solved}/{len(examples)} résolues en {round(time() - t0, 2)} s")
+    for nb_workers in l_nb_workers:
+        t0 = time()
+        nb_solved = 0
+        for formula, instance in examples:
+            formula, index, duration = parallel_die_retry(instance, n, size, nb_bits, nb_workers)
+            nb_solved += formula.score_formula(instance) > 0.99
+        print(f"{nb_workers} processus : {nb_solved}/{len(examples)} résolues en {round(time() - t0, 2)} s")
+
+def recreate_as(formula, node_class):
+    # copie de formula dont les noeuds sont des node_class
+    node = node_class(formula.value)
+    for child in formula.children:
+        node.add_child(recreate_as(child, node_class))
+    return node
 
 # test_evolution(5, 15, 5, False)
 # test_seed(5, 15, 5)
@@ -79,7 +175,9 @@ def benchmark1():
 
 
 
-benchmark1()
+if __name__ == "__main__":
+    # les processus de ProcessPoolExecutor peuvent réimporter ce module
+    benchmark1()
 # algonames = ["algo_softmax20_1000_1", "algo_softmax20_1000_0", "algo_softmax50_1000_0", "algo_softmax50_1000_1"]
 """
 algonames = ["algo_die_retry"]
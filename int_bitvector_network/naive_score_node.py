@@ -1,41 +1,56 @@
-from node import Node, GATES
+from node import Node
+from gates import candidate_gates
+from threads import thread_map
+from bitvector_tools import list_instance
 
 class NaiveScoreNode(Node):
+    # mêmes attributs que InfluenceTargetScoreNode, pour que les algorithmes (stats,
+    # cache, mouvements sémantiques) fonctionnent quel que soit CLASS_SCORE ;
+    # influence et target restent à None : pas de mouvement sémantique possible
+    __slots__ = ("influence", "target", "nb_evaluated", "nb_skipped", "score_value")
+
     def __init__(self, value = None):
         super().__init__(value)
+        self.influence = None
+        self.target = None
+        self.score_value = None
+        self.nb_evaluated = 0
+        self.nb_skipped = 0
 
     def score_formula(self, instance):
+        return self.score_with(instance, None, None)
+
+    def score_with(self, instance, node, value):
+        # score de la formule où node prend la valeur value, l'arbre n'est pas modifié
+        # une instance empaquetée est évaluée sur sa forme liste
+        instance = list_instance(instance)
         score = 0
-        n = len(instance)
-        for input, y in instance:
-            result = self.calcul(input)
+        nb_bits = instance[0]
+        for input, y in instance[1:]:
+            result = self.calcul_with(node, value, input, nb_bits)
             if result == y:
                 score += 1
-        return score / n
+        return score / (len(instance) - 1)
 
     def update_tree_score(self, instance):
-        self.update_score(instance, self, self.score_formula(instance))
-    
-    def update_score(self, instance, root, score):
-        arity = len(self.children)
-        n = len(instance[0][0])
-        nb_bits = len(instance[0][0][0])
-        current_value = self.value
-        self.score = {}
-        l_gates = list(range(n))
-        if arity == 1:
-            l_gates = ["id", "not"]
-            l_gates += ["<<" + str(i) for i in range(1, nb_bits + 1)]
-            l_gates += [">>" + str(i) for i in range(1, nb_bits + 1)]
-        if arity == 2:
-            l_gates = GATES[arity]
-
-        for i in l_gates:
-            if i != current_value:
-                self.value = i
-                self.score[i] = root.score_formula(instance) - score
-        self.value = current_value
-
-        for child in self.children:
-            child.update_score(instance, root, score)
+        # un re-scoring complet par porte candidate ; ils sont indépendants et
+        # lisent l'arbre sans l'écrire, on peut donc les répartir sur des threads
+        instance = list_instance(instance)
+        score = self.score_formula(instance)
+        nb_bits = instance[0]
+        n = len(instance[1][0])
+        candidates = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.score.clear()
+            node.score_value = node.value
+            for gate in candidate_gates(len(node.children), nb_bits, n):
+                if gate != node.value:
+                    candidates.append((node, gate))
+            stack.extend(node.children)
 
+        new_scores = thread_map(lambda candidate: self.score_with(instance, candidate[0], candidate[1]), candidates)
+        for (node, gate), new_score in zip(candidates, new_scores):
+            node.score[gate] = new_score - score
+        self.nb_evaluated, self.nb_skipped = len(candidates), 0
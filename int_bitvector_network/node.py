@@ -1,7 +1,10 @@
 from bitvector_tools import calcul_gate
-GATES = {1: ["id", "not", "<<", ">>"], 2: ["and", "or", "xor"]}
+from gates import GATES, gate_name, value_name
 
 class Node:
+    # pas de __dict__ par noeud, les sous-classes déclarent aussi leurs attributs
+    __slots__ = ("value", "parent", "children", "score", "proba", "result", "cache_input", "dirty")
+
     def __init__(self, value = None):
         self.value = value
         self.parent = None
@@ -9,23 +12,52 @@ class Node:
         self.score = {}
         self.proba = {}
         self.result = None
+        # self.result est valable pour cache_input tant que le noeud n'est pas sale
+        self.cache_input = None
+        self.dirty = True
 
     def add_child(self, child):
         assert child.parent is None
         self.children.append(child)
         child.parent = self
+        self.mark_dirty()
+
+    def set_value(self, value):
+        self.value = value
+        self.mark_dirty()
+
+    def replace_subtree(self, other):
+        # le noeud prend la valeur et les enfants de other en gardant son parent
+        for child in self.children:
+            child.parent = None
+        self.value = other.value
+        self.children = other.children
+        other.children = []
+        for child in self.children:
+            child.parent = self
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        # un noeud sale a tous ses ancêtres sales, on peut s'arrêter au premier
+        node = self
+        while node is not None and not node.dirty:
+            node.dirty = True
+            node = node.parent
 
     def image(self, param = "value", prefixe="", dernier=True):
-        node_content = str(self.value)
+        arity = len(self.children)
+        node_content = value_name(self.value, arity)
         if param == "score":
             round_score = {}
             for key in self.score:
-                round_score[key] = round(self.score[key], 2)
+                name = gate_name(key) if arity else key
+                round_score[name] = round(self.score[key], 2)
             node_content = str(round_score)
         if param == "proba":
             round_proba = {}
             for key in self.proba:
-                round_proba[key] = round(self.proba[key], 2)
+                name = gate_name(key) if arity else key
+                round_proba[name] = round(self.proba[key], 2)
             node_content = str(round_proba)
         if param == "result":
             node_content = str(self.result)
@@ -52,7 +84,7 @@ class Node:
         self.update_tree_proba()
 
     def get_seed(self, split_c = " "):
-        seed = str(self.value)
+        seed = value_name(self.value, len(self.children))
 
         for child in self.children:
             child_seed = child.get_seed(split_c)
@@ -60,8 +92,28 @@ class Node:
             seed = seed + split_c + str(n) + split_c + child_seed
         return seed + split_c
     
-    def calcul(self, input, nb_bits):
-        children_result = [child.calcul(input, nb_bits) for child in self.children]
+    def calcul(self, input, nb_bits, nb_lanes = 1):
+        # input peut être un exemple seul ou les variables empaquetées de toute l'instance
+        children_result = [child.calcul(input, nb_bits, nb_lanes) for child in self.children]
+
+        self.result = calcul_gate(children_result, self.value, input, nb_bits, nb_lanes)
+        self.cache_input = input
+        self.dirty = False
+        return self.result
+
+    def calcul_with(self, node, value, input, nb_bits, nb_lanes = 1):
+        # comme calcul si node avait la valeur value, sans rien écrire dans l'arbre :
+        # plusieurs threads peuvent évaluer des variantes du même arbre
+        children_result = [child.calcul_with(node, value, input, nb_bits, nb_lanes) for child in self.children]
+        return calcul_gate(children_result, value if self is node else self.value, input, nb_bits, nb_lanes)
+
+    def calcul_incremental(self, input, nb_bits, nb_lanes = 1):
+        # seuls les noeuds modifiés depuis le dernier calcul sur input et leurs ancêtres sont recalculés
+        if not self.dirty and self.cache_input is input:
+            return self.result
+        children_result = [child.calcul_incremental(input, nb_bits, nb_lanes) for child in self.children]
 
-        self.result = calcul_gate(children_result, self.value, input, nb_bits)
+        self.result = calcul_gate(children_result, self.value, input, nb_bits, nb_lanes)
+        self.cache_input = input
+        self.dirty = False
         return self.result
\ No newline at end of file
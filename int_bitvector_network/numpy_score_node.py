@@ -0,0 +1,88 @@
+from influence_target_score_node import InfluenceTargetScoreNode
+from bitvector_tools import bit_not, calcul_gate, unpack_instance
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_COLUMN_INSTANCES = 16
+_column_instances = {}
+
+def instance_to_columns(instance):
+    # une colonne par variable : l'entrée i de tous les exemples dans un seul tableau
+    if np is None:
+        raise ImportError("le backend numpy nécessite numpy")
+    if isinstance(instance, tuple):
+        # instance déjà empaquetée (lots de minibatch_evolution), non mise en cache
+        return compute_columns(unpack_instance(instance))
+    key = id(instance)
+    if key in _column_instances and _column_instances[key][0] is instance:
+        return _column_instances[key][1]
+
+    columns = compute_columns(instance)
+    if len(_column_instances) >= MAX_COLUMN_INSTANCES:
+        del _column_instances[next(iter(_column_instances))]
+    _column_instances[key] = (instance, columns)
+    return columns
+
+def compute_columns(instance):
+    nb_bits = instance[0]
+    nb_input = len(instance) - 1
+    n = len(instance[1][0])
+    if nb_bits <= 32:
+        dtype = np.uint32
+    elif nb_bits <= 64:
+        dtype = np.uint64
+    else:
+        raise ValueError("le backend numpy est limité à 64 bits")
+    inputs = [np.array([input[i] for input, y in instance[1:]], dtype=dtype) for i in range(n)]
+    y = np.array([y for input, y in instance[1:]], dtype=dtype)
+    return (nb_bits, nb_input, inputs, y)
+
+def popcount(array):
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(array).sum())
+    return int(np.unpackbits(array.view(np.uint8)).sum())
+
+class NumpyScoreNode(InfluenceTargetScoreNode):
+    __slots__ = ()
+
+    def __init__(self, value = None):
+        super().__init__(value)
+
+    def score_formula(self, instance):
+        nb_bits, nb_input, inputs, y = instance_to_columns(instance)
+        result = self.calcul(inputs, nb_bits)
+        score = popcount(bit_not(y ^ result, nb_bits))
+        return score / (nb_input*nb_bits)
+
+    def update_tree_score(self, instance):
+        nb_bits, nb_input, inputs, y = instance_to_columns(instance)
+        self.influence = np.full(nb_input, (1 << nb_bits) - 1, dtype=y.dtype)
+        self.target = y
+        self.init_score(len(inputs), nb_bits)
+        self.calcul(inputs, nb_bits)
+        self.update_influence_target(nb_bits)
+        self.nb_evaluated, self.nb_skipped = self.update_score(inputs, y, nb_bits)
+        self.finish_score(nb_input*nb_bits)
+
+    def update_score(self, input, y, nb_bits):
+        if not self.influence.any():
+            return 0, self.count_candidates()
+
+        children_result = [child.result for child in self.children]
+        current_nb_match = popcount(bit_not(self.result ^ self.target, nb_bits) & self.influence)
+
+        for gate in self.score:
+            result = calcul_gate(children_result, gate, input, nb_bits)
+            nb_match = popcount(bit_not(result ^ self.target, nb_bits) & self.influence)
+
+            self.score[gate] += nb_match - current_nb_match
+
+        nb_evaluated, nb_skipped = len(self.score), 0
+        for child in self.children:
+            child_evaluated, child_skipped = child.update_score(input, y, nb_bits)
+            nb_evaluated += child_evaluated
+            nb_skipped += child_skipped
+        return nb_evaluated, nb_skipped
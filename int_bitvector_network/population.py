@@ -0,0 +1,57 @@
+import random
+from softmax_node import SoftmaxNode as Node
+from bitvector_tools import pack_instance, calcul_gate
+
+# Outils pour les algorithmes à population : évaluation groupée sur l'instance
+# empaquetée, copie, croisement et sélection.
+
+def calcul_shared(node, inputs, nb_bits, nb_lanes, memo):
+    # renvoie (seed, résultat) ; un sous-arbre déjà rencontré dans la population,
+    # même chez un autre individu, n'est calculé qu'une fois
+    children = [calcul_shared(child, inputs, nb_bits, nb_lanes, memo) for child in node.children]
+    seed = str(node.value) + "".join("(" + child_seed + ")" for child_seed, child_result in children)
+    if seed not in memo:
+        memo[seed] = calcul_gate([child_result for child_seed, child_result in children], node.value, inputs, nb_bits, nb_lanes)
+    return seed, memo[seed]
+
+def score_population(population, instance):
+    # une seule passe pour toute la population : instance empaquetée une fois,
+    # sous-arbres communs (fréquents après croisement) partagés
+    nb_bits, nb_lanes, inputs, y = pack_instance(instance)
+    memo = {}
+    scores = []
+    for f in population:
+        seed, result = calcul_shared(f, inputs, nb_bits, nb_lanes, memo)
+        scores.append((nb_lanes*nb_bits - (y ^ result).bit_count()) / (nb_lanes*nb_bits))
+    return scores
+
+def copy_formula(f):
+    new_formula = Node(f.value, f.tau)
+    for child in f.children:
+        new_formula.add_child(copy_formula(child))
+    return new_formula
+
+def subtree_nodes(node, nodes, sizes):
+    # remplit nodes et sizes (taille de chaque sous-arbre), renvoie la taille de node
+    nodes.append(node)
+    sizes[node] = 1 + sum(subtree_nodes(child, nodes, sizes) for child in node.children)
+    return sizes[node]
+
+def crossover(f1, f2):
+    # copie de f1 dont un sous-arbre est remplacé par un sous-arbre de f2 de même
+    # taille, la taille de la formule ne change donc pas
+    child = copy_formula(f1)
+    nodes, sizes = [], {}
+    subtree_nodes(child, nodes, sizes)
+    nodes2, sizes2 = [], {}
+    subtree_nodes(f2, nodes2, sizes2)
+
+    node = random.choice(nodes)
+    candidates = [node2 for node2 in nodes2 if sizes2[node2] == sizes[node]]
+    if candidates:
+        node.replace_subtree(copy_formula(random.choice(candidates)))
+    return child
+
+def tournament(population, scores, k):
+    i = max(random.sample(range(len(population)), k), key=lambda j: scores[j])
+    return population[i]
@@ -1,40 +1,56 @@
 from examples import*
+from algorithms import get_algo
+from shared_instance import share_instance, attach_instance, release_instance
+from concurrent.futures import ProcessPoolExecutor
+import random
 
-def result_example_file(algo, result_file, filename, nb_instances, dir_benchmark):
+def instance_seed(seed, filename, num_exemple):
+    # graine propre à chaque instance : le résultat ne dépend pas de l'ordre d'exécution
+    return f"{seed}_{filename}_{num_exemple}"
 
-    def padding(n, type):
-        taille_num_exemple = 3
-        taille_score = 3
-        if type == "num_exemple":
-            s = str(n)
-            pad = taille_num_exemple - len(s)
-            return s + " "*pad
-        if type == "score":
-            score = int(n*100)
-            s = str(score)
-            pad = taille_score - len(s)
-            return s + " "*pad
+def solve_instance(algoname, handle, n, size, nb_bits, seed):
+    # handle : instance en mémoire partagée (voir shared_instance)
+    random.seed(seed)
+    return get_algo(algoname)(attach_instance(handle), n, size, nb_bits)
 
+def result_example_file(algo, result_file, filename, nb_instances, dir_benchmark, seed = None):
     s = "------------ RESULTS ------------\n\n"
     with open(result_file, "w") as file:
         file.write(s)
         file.write(filename+"\n\n")
-        num_exemple = 0
         params_str = (filename.split(".")[0]).split("_")
         n, nb_bits, size = [int(param) for param in params_str]
 
-        for formula, instance in extract_examples(dir_benchmark + "/" + filename):
+        scores = []
+        for num_exemple, (formula, instance) in enumerate(extract_examples(dir_benchmark + "/" + filename)):
             print(num_exemple)
-            score = algo(instance, n, size, nb_bits)
-            file.write(padding(num_exemple, "num_exemple") + " : " + padding(score, "score") + " | ")
-            num_exemple += 1
-            if num_exemple % nb_instances == 0:
-                file.write("\n")
-        file.write("\n")
+            if seed is not None:
+                random.seed(instance_seed(seed, filename, num_exemple))
+            scores.append(algo(instance, n, size, nb_bits))
+        write_scores(file, scores, nb_instances)
+
 
+def result_benchmark(algo, result_file, nb_instances, dir_benchmark, seed = None):
+    s = "------------ RESULTS ------------\n\n"
+    with open(result_file, "w") as file:
+        files = os.listdir(dir_benchmark)
+        files.sort()
+        file.write(s)
+        for filename in files:
+            file.write(filename+"\n\n")
+            print(filename)
+            params_str = (filename.split(".")[0]).split("_")
+            n, nb_bits, size = [int(param) for param in params_str]
 
-def result_benchmark(algo, result_file, nb_instances, dir_benchmark):
+            scores = []
+            for num_exemple, (formula, instance) in enumerate(extract_examples(f"{dir_benchmark}/" + filename)):
+                if seed is not None:
+                    random.seed(instance_seed(seed, filename, num_exemple))
+                scores.append(algo(instance, n, size, nb_bits))
+            write_scores(file, scores, nb_instances)
 
+def write_scores(file, scores, nb_instances):
+    # format commun aux résultats en série, en parallèle et de la file de jobs
     def padding(n, type):
         taille_num_exemple = 3
         taille_score = 3
@@ -48,25 +64,48 @@ def result_benchmark(algo, result_file, nb_instances, dir_benchmark):
             pad = taille_score - len(s)
             return s + " "*pad
 
+    for num_exemple, score in enumerate(scores):
+        file.write(padding(num_exemple, "num_exemple") + " : " + padding(score, "score") + " | ")
+        if (num_exemple + 1) % nb_instances == 0:
+            file.write("\n")
+    file.write("\n")
+
+def solve_file(executor, algoname, filename, dir_benchmark, seed):
+    # scores dans l'ordre des instances du fichier, quel que soit l'ordre de fin des processus
+    params_str = (filename.split(".")[0]).split("_")
+    n, nb_bits, size = [int(param) for param in params_str]
+    # chaque tâche ne transmet que le handle de son instance et sa graine
+    shared = [share_instance(instance) for formula, instance in extract_examples(dir_benchmark + "/" + filename)]
+    try:
+        args = [(algoname, handle, n, size, nb_bits, instance_seed(seed, filename, num_exemple))
+                for num_exemple, (shm, handle) in enumerate(shared)]
+        return list(executor.map(solve_instance, *zip(*args)))
+    finally:
+        for shm, handle in shared:
+            release_instance(shm)
+
+def parallel_result_example_file(algoname, result_file, filename, nb_instances, dir_benchmark, nb_workers = None, seed = 0):
+    # les instances sont réparties sur nb_workers processus (tous les coeurs par défaut) ;
+    # même fichier que result_example_file(..., seed=seed) en série
     s = "------------ RESULTS ------------\n\n"
+    with ProcessPoolExecutor(nb_workers) as executor:
+        scores = solve_file(executor, algoname, filename, dir_benchmark, seed)
     with open(result_file, "w") as file:
-        files = os.listdir(dir_benchmark)
-        files.sort()
+        file.write(s)
+        file.write(filename+"\n\n")
+        write_scores(file, scores, nb_instances)
+
+def parallel_result_benchmark(algoname, result_file, nb_instances, dir_benchmark, nb_workers = None, seed = 0):
+    s = "------------ RESULTS ------------\n\n"
+    files = os.listdir(dir_benchmark)
+    files.sort()
+    with ProcessPoolExecutor(nb_workers) as executor, open(result_file, "w") as file:
         file.write(s)
         for filename in files:
-            file.write(filename+"\n\n")
             print(filename)
-            num_exemple = 0
-            params_str = (filename.split(".")[0]).split("_")
-            n, nb_bits, size = [int(param) for param in params_str]
-
-            for formula, instance in extract_examples(f"{dir_benchmark}/" + filename):
-                score = algo(instance, n, size, nb_bits)
-                file.write(padding(num_exemple, "num_exemple") + " : " + padding(score, "score") + " | ")
-                num_exemple += 1
-                if num_exemple % nb_instances == 0:
-                    file.write("\n")
-            file.write("\n")
+            scores = solve_file(executor, algoname, filename, dir_benchmark, seed)
+            file.write(filename+"\n\n")
+            write_scores(file, scores, nb_instances)
 
 def exploit_results(f_exploit, l_nb_inputs, result_file, exploited_result_file):
     dico_results = {}
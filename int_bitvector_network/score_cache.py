@@ -0,0 +1,68 @@
+from collections import OrderedDict
+
+# Mémoïsation des scores : la marche softmax revient souvent sur des formules
+# déjà vues (par exemple en oscillant entre deux portes sur un même noeud). Une
+# formule est identifiée par une clé canonique : ses noeuds en ordre préfixe, les
+# enfants des portes binaires (AND, OR, XOR, toutes commutatives) rangés par clé
+# croissante. Deux formules qui ne diffèrent que par l'ordre de ces enfants ont
+# la même clé, et leurs noeuds pris dans l'ordre canonique ont les mêmes tables
+# de score ; on garde pour chaque clé le score et une copie de ces tables.
+
+SCORE_CACHE_SIZE = 1024
+
+def canonical_nodes(node, nodes = None):
+    # renvoie la clé canonique du sous-arbre (tuples imbriqués (valeur, clés des
+    # enfants...)) et ajoute ses noeuds à nodes dans l'ordre canonique
+    if nodes is None:
+        nodes = []
+    nodes.append(node)
+    if not node.children:
+        return (node.value,), nodes
+    if len(node.children) == 1:
+        return (node.value, canonical_nodes(node.children[0], nodes)[0]), nodes
+    left_nodes, right_nodes = [], []
+    left = canonical_nodes(node.children[0], left_nodes)[0]
+    right = canonical_nodes(node.children[1], right_nodes)[0]
+    if right < left:
+        left, right = right, left
+        left_nodes, right_nodes = right_nodes, left_nodes
+    nodes += left_nodes
+    nodes += right_nodes
+    return (node.value, left, right), nodes
+
+class ScoreCache:
+    def __init__(self, size = SCORE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        # le cache ne vaut que pour une instance, il est vidé quand elle change
+        self.instance = None
+        # noeuds et clé du dernier lookup, réutilisés par store
+        self.nodes = None
+        self.key = None
+
+    def lookup(self, f, instance):
+        # renvoie le score et recopie les tables dans f si la formule est connue, None sinon
+        if instance is not self.instance:
+            self.entries.clear()
+            self.instance = instance
+        self.key, self.nodes = canonical_nodes(f)
+        if self.key not in self.entries:
+            return None
+        self.entries.move_to_end(self.key)
+        score, tables, nb_evaluated, nb_skipped = self.entries[self.key]
+        for node, table in zip(self.nodes, tables):
+            # copie : les tables du cache ne doivent pas être modifiées par init_score
+            node.score.clear()
+            node.score.update(table)
+            node.score_value = node.value
+        # listes aplaties dans l'ordre réel de f, qui peut différer de l'ordre canonique
+        f.collect_scores()
+        f.nb_evaluated, f.nb_skipped = nb_evaluated, nb_skipped
+        return score
+
+    def store(self, f, score):
+        # f doit être dans l'état du dernier lookup, tables à jour
+        tables = [dict(node.score) for node in self.nodes]
+        self.entries[self.key] = (score, tables, f.nb_evaluated, f.nb_skipped)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
@@ -0,0 +1,79 @@
+from softmax_node import SoftmaxNode as Node
+from enumeration import enumerate_formulas, build_formula
+from bitvector_tools import pack_instance
+from gates import ID
+
+# Rétropropagation sémantique : après update_tree_score, chaque noeud connaît
+# les bits qu'il devrait produire (target) et ceux qui comptent pour la sortie
+# (influence). On cherche dans un index de toutes les petites formules, rangées
+# par signature sur l'instance, celle qui fait le moins d'erreurs sur ces bits,
+# et on remplace tout le sous-arbre d'un coup.
+
+INDEX_MAX_SIZE = 3
+# seuls les sous-arbres de cette taille au plus sont remplacés : un grand sous-arbre
+# remplacé par une petite formule complétée de id perd des portes binaires
+MOVE_MAX_SIZE = 3
+MAX_INDEXES = 16
+_indexes = {}
+
+def signature_index(instance, max_size = INDEX_MAX_SIZE):
+    # (expressions, tailles, signatures triées par taille croissante), une fois par instance
+    key = (id(instance), max_size)
+    if key in _indexes and _indexes[key][0] is instance:
+        return _indexes[key][1]
+
+    packed = pack_instance(instance)
+    # un index incomplet (budget de signatures atteint) reste utilisable, il propose moins de remplacements
+    seen, sizes, complete = enumerate_formulas(packed, len(packed[2]), max_size)
+    index = (seen, sizes, sorted(seen, key=sizes.get))
+
+    if len(_indexes) >= MAX_INDEXES:
+        del _indexes[next(iter(_indexes))]
+    _indexes[key] = (instance, index)
+    return index
+
+def subtree_sizes(node, sizes):
+    sizes[node] = 1 + sum(subtree_sizes(child, sizes) for child in node.children)
+    return sizes[node]
+
+def best_replacement(node, size, index):
+    # renvoie (nombre d'erreurs, signature) de la meilleure formule de taille <= size
+    seen, sizes, signatures = index
+    target, influence = node.target, node.influence
+    if target in seen and sizes[target] <= size:
+        return 0, target
+    best_error, best_signature = None, None
+    for signature in signatures:
+        if sizes[signature] > size:
+            break
+        nb_error = ((signature ^ target) & influence).bit_count()
+        if best_error is None or nb_error < best_error:
+            best_error, best_signature = nb_error, signature
+    return best_error, best_signature
+
+def best_semantic_move(f, index):
+    # le gain est exact : influence et target supposent le reste de l'arbre fixé
+    sizes = {}
+    subtree_sizes(f, sizes)
+    best = (0, None, None)
+    for node, size in sizes.items():
+        if size > MOVE_MAX_SIZE or not node.influence:
+            continue
+        current_nb_error = ((node.result ^ node.target) & node.influence).bit_count()
+        if current_nb_error == 0:
+            continue
+        nb_error, signature = best_replacement(node, size, index)
+        if current_nb_error - nb_error > best[0]:
+            best = (current_nb_error - nb_error, node, signature)
+    return best
+
+def apply_semantic_move(node, signature, index):
+    # complétée par des id pour que la taille de la formule ne change pas
+    seen, sizes, signatures = index
+    replacement = build_formula(seen[signature])
+    size = subtree_sizes(node, {})
+    for i in range(size - sizes[signature]):
+        wrapper = Node(ID)
+        wrapper.add_child(replacement)
+        replacement = wrapper
+    node.replace_subtree(replacement)
@@ -0,0 +1,63 @@
+from multiprocessing import shared_memory
+from bitvector_tools import pack_instance
+
+# Instances en mémoire partagée pour les processus de calcul. L'instance est
+# empaquetée une fois et ses colonnes (une par variable, puis y) sont écrites
+# bout à bout dans un bloc partagé, chacune en mots de 64 bits petit-boutistes :
+# le mot j d'une colonne contient les voies des exemples 64*j/nb_bits et suivants.
+# Une tâche ne transmet plus que le handle (nom du bloc et dimensions). Un
+# processus n'en relit que la forme empaquetée, que les scoreurs par voies
+# acceptent directement ; la forme liste n'est reconstruite, une fois par
+# processus (bitvector_tools.list_instance), que pour les algorithmes qui tirent
+# des exemples (minibatch, cegis) et les scoreurs naïfs.
+
+MAX_ATTACHED_INSTANCES = 16
+# formes empaquetées déjà lues dans ce processus, par nom de bloc
+_attached_instances = {}
+
+def column_size(nb_bits, nb_lanes):
+    # taille en octets d'une colonne, arrondie au mot de 64 bits
+    return 8*((nb_bits*nb_lanes + 63)//64)
+
+def share_instance(instance):
+    # renvoie (bloc, handle) ; le créateur garde le bloc et le libère avec release_instance
+    nb_bits, nb_lanes, inputs, y = pack_instance(instance)
+    size = column_size(nb_bits, nb_lanes)
+    columns = inputs + [y]
+    shm = shared_memory.SharedMemory(create=True, size=size*len(columns))
+    for k, column in enumerate(columns):
+        shm.buf[k*size:(k+1)*size] = column.to_bytes(size, "little")
+    return shm, (shm.name, nb_bits, nb_lanes, len(inputs))
+
+def release_instance(shm):
+    shm.close()
+    shm.unlink()
+
+def open_shared(name):
+    # sans suivi par le resource_tracker (Python >= 3.13) : seul le créateur libère
+    # le bloc. Avant 3.13, un processus de calcul qui a son propre resource_tracker
+    # détruit le bloc à sa sortie ; les blocs doivent donc être créés avant le
+    # premier fork du pool, comme le font results.solve_file et parallel_die_retry
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+def attach_instance(handle):
+    # renvoie la forme empaquetée (nb_bits, nb_lanes, entrées, y) de l'instance
+    name, nb_bits, nb_lanes, n = handle
+    if name in _attached_instances:
+        return _attached_instances[name]
+
+    size = column_size(nb_bits, nb_lanes)
+    shm = open_shared(name)
+    try:
+        columns = [int.from_bytes(shm.buf[k*size:(k+1)*size], "little") for k in range(n + 1)]
+    finally:
+        shm.close()
+    packed = (nb_bits, nb_lanes, columns[:n], columns[n])
+
+    if len(_attached_instances) >= MAX_ATTACHED_INSTANCES:
+        del _attached_instances[next(iter(_attached_instances))]
+    _attached_instances[name] = packed
+    return packed
@@ -0,0 +1,85 @@
+from softmax_node import SoftmaxNode as Node
+from gates import GATE_KIND, SHIFT_AMOUNT, ID, NOT, AND, OR, XOR, SHL, SHR, shift_opcode
+
+# Réécriture des formules vers une forme canonique plus petite, de même valeur
+# sur nb_bits bits. Les règles sont appliquées de bas en haut :
+# id x -> x, not not x -> x, décalages de même sens fusionnés, décalage d'au moins
+# nb_bits -> 0, x and x -> x, x or x -> x, x xor x -> 0, x op not x, éléments neutres
+# et absorbants, enfants des portes commutatives triés par seed.
+# La constante 0 s'écrit "<<nb_bits x0" et la constante 1...1 "not <<nb_bits x0".
+
+def make(value, children = None):
+    children = [] if children is None else children
+    node = Node(value)
+    for child in children:
+        child.parent = None
+        node.add_child(child)
+    return node
+
+def zero(nb_bits):
+    return make(shift_opcode(SHL, nb_bits), [make(0)])
+
+def ones(nb_bits):
+    return make(NOT, [zero(nb_bits)])
+
+def is_zero(node, nb_bits):
+    return len(node.children) == 1 and GATE_KIND[node.value] in [SHL, SHR] and SHIFT_AMOUNT[node.value] >= nb_bits
+
+def is_ones(node, nb_bits):
+    return len(node.children) == 1 and GATE_KIND[node.value] == NOT and is_zero(node.children[0], nb_bits)
+
+def is_not(node):
+    return len(node.children) == 1 and GATE_KIND[node.value] == NOT
+
+def simplify_unary(value, child, nb_bits):
+    kind = GATE_KIND[value]
+    if kind == ID:
+        return child
+    if kind == NOT:
+        if is_not(child):
+            return child.children[0]
+        return make(NOT, [child])
+
+    m = SHIFT_AMOUNT[value]
+    if is_zero(child, nb_bits):
+        return child
+    if len(child.children) == 1 and GATE_KIND[child.value] == kind:
+        m += SHIFT_AMOUNT[child.value]
+        child = child.children[0]
+    if m >= nb_bits:
+        return zero(nb_bits)
+    return make(shift_opcode(kind, m), [child])
+
+def simplify_binary(value, child1, child2, nb_bits):
+    seed1, seed2 = child1.get_seed(), child2.get_seed()
+    if seed2 < seed1:
+        child1, child2 = child2, child1
+        seed1, seed2 = seed2, seed1
+
+    if seed1 == seed2:
+        return zero(nb_bits) if value == XOR else child1
+    for x, y in [(child1, child2), (child2, child1)]:
+        if is_zero(x, nb_bits):
+            return x if value == AND else y
+        if is_ones(x, nb_bits):
+            if value == AND:
+                return y
+            if value == OR:
+                return x
+            return simplify_unary(NOT, y, nb_bits)
+        if is_not(x) and x.children[0].get_seed() == y.get_seed():
+            return zero(nb_bits) if value == AND else ones(nb_bits)
+    return make(value, [child1, child2])
+
+def simplify(formula, nb_bits):
+    # renvoie une nouvelle formule, formula n'est pas modifiée
+    if not formula.children:
+        return make(formula.value)
+    children = [simplify(child, nb_bits) for child in formula.children]
+    if len(children) == 1:
+        node = simplify_unary(formula.value, children[0], nb_bits)
+    else:
+        node = simplify_binary(formula.value, children[0], children[1], nb_bits)
+    # node peut être un sous-arbre repris d'un noeud supprimé
+    node.parent = None
+    return node
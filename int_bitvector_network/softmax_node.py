@@ -1,68 +1,126 @@
 from naive_score_node import NaiveScoreNode
 from less_naive_score_node import LessNaiveScoreNode
 from influence_target_score_node import InfluenceTargetScoreNode
+from numpy_score_node import NumpyScoreNode
+from bisect import bisect_left
+from itertools import accumulate
 import random
 from math import exp
 
 DEFAULT_TAU = 10
+# NumpyScoreNode : mêmes scores, calculés colonne par colonne (nécessite numpy),
+# plus lent que les voies empaquetées d'après main.benchmark_threads
 CLASS_SCORE = InfluenceTargetScoreNode
 
+def softmax_weights(scores, tau):
+    # log-sum-exp : on retranche le score max pour que exp ne déborde jamais
+    if not scores:
+        return []
+    score_max = max(scores)
+    return [exp(tau*(score - score_max)) for score in scores]
+
 class SoftmaxNode(CLASS_SCORE):
+    __slots__ = ("tau", "flat_nodes", "flat_gates", "flat_scores", "journal")
+
     def __init__(self, value = None, tau = DEFAULT_TAU):
         super().__init__(value)
         self.tau = tau
-        self.f = lambda x: exp(self.tau*x)
+        # scores candidats de tout l'arbre, remplis à la racine par collect_scores
+        self.flat_nodes = None
+        self.flat_gates = None
+        self.flat_scores = None
+        # journal des mouvements (noeud, ancienne valeur), tenu à la racine si start_journal a été appelé
+        self.journal = None
 
     def add_child(self, child):
         super().add_child(child)
         child.change_tau(self.tau)
 
+    def replace_subtree(self, other):
+        super().replace_subtree(other)
+        self.change_tau(self.tau)
+
     def change_tau(self, tau):
         self.tau = tau
-        self.f = lambda x: exp(self.tau*x)
         for child in self.children:
             child.change_tau(tau)
 
-    def update_tree_proba(self):
-        self.update_proba(self, self.get_sum())
+    def update_tree_score(self, instance):
+        super().update_tree_score(instance)
+        self.collect_scores()
 
-    def update_proba(self, root, sum):
-        self.proba = {}
-        for gate in self.score:
-            self.proba[gate] = self.f(self.score[gate]) / sum
+    def collect_scores(self):
+        # même ordre que l'ancien parcours en profondeur : le noeud puis ses enfants
+        if self.flat_scores is None:
+            self.flat_nodes = []
+            self.flat_gates = []
+            self.flat_scores = []
+        self.flat_nodes.clear()
+        self.flat_gates.clear()
+        self.flat_scores.clear()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for gate, score in node.score.items():
+                self.flat_nodes.append(node)
+                self.flat_gates.append(gate)
+                self.flat_scores.append(score)
+            stack.extend(reversed(node.children))
 
-        for child in self.children:
-            child.update_proba(root, sum)
+    def update_tree_proba(self):
+        self.collect_scores()
+        weights = softmax_weights(self.flat_scores, self.tau)
+        total = sum(weights)
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node.proba.clear()
+            stack.extend(node.children)
+        for node, gate, weight in zip(self.flat_nodes, self.flat_gates, weights):
+            node.proba[gate] = weight / total
 
-    def get_sum(self):
-        return self.dfs_sum()
-    
-    def dfs_sum(self):
-        node_sum = 0
-        for k, v in self.score.items():
-            node_sum += self.f(v)
+    def cumulative_weights(self):
+        return list(accumulate(softmax_weights(self.flat_scores, self.tau)))
 
-        for child in self.children:
-            node_sum += child.dfs_sum()
-        return node_sum
+    def sample_moves(self, k):
+        # k tirages indépendants (noeud, porte) selon la même loi que softmax
+        if not self.flat_scores:
+            return []
+        indices = random.choices(range(len(self.flat_scores)), cum_weights=self.cumulative_weights(), k=k)
+        return [(self.flat_nodes[i], self.flat_gates[i]) for i in indices]
 
     def softmax(self):
-        sum = self.get_sum()
-        p = random.random()
-        x = self.dfs_proba(0, p, sum)
-        assert x == -1
-
-    def dfs_proba(self, previous_proba, p, sum):
-        node_proba = previous_proba
-        for k, v in self.score.items():
-            node_proba += self.f(v) / sum
-            if p <= node_proba:
-                self.value = k
-                return -1
-            
-        for child in self.children:
-            node_proba = child.dfs_proba(node_proba, p, sum)
-            if node_proba == -1:
-                return -1
-        
-        return node_proba
\ No newline at end of file
+        if not self.flat_scores:
+            return
+        cum_weights = self.cumulative_weights()
+        i = bisect_left(cum_weights, random.random()*cum_weights[-1])
+        i = min(i, len(cum_weights) - 1)
+        return self.apply_move(self.flat_nodes[i], self.flat_gates[i])
+
+    def apply_move(self, node, value):
+        # appelé sur la racine ; renvoie le mouvement inverse
+        old_value = node.value
+        node.set_value(value)
+        if self.journal is not None:
+            self.journal.append((node, old_value))
+        return node, old_value
+
+    def start_journal(self):
+        self.journal = []
+
+    def snapshot(self):
+        # repère dans le journal de l'état courant
+        return len(self.journal)
+
+    def rollback(self, mark = 0):
+        # défait les mouvements postérieurs à mark, chacun en O(profondeur) pour marquer les ancêtres sales
+        while len(self.journal) > mark:
+            node, old_value = self.journal.pop()
+            node.set_value(old_value)
+
+    def penalize(self, moves, penalty):
+        # moves : couples (noeud, porte) à défavoriser, leur poids est divisé par exp(tau*penalty)
+        moves = set(moves)
+        for i in range(len(self.flat_scores)):
+            if (self.flat_nodes[i], self.flat_gates[i]) in moves:
+                self.flat_scores[i] -= penalty
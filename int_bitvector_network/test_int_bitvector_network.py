@@ -0,0 +1,182 @@
+import os
+import random
+from multiprocessing import Pool
+from threading import Event, Thread
+from time import time, sleep
+
+from init_functions import create_rd_formula, create_rd_instance, recreate_formula
+from bitvector_tools import pack_examples, pack_instance, unpack_instance, list_instance
+from shared_instance import share_instance, release_instance, attach_instance
+from job_queue import job_paths, read_token, try_lock, remove_lock, reclaim_expired, claim_job, heartbeat
+
+# Tests pytest, lancés depuis int_bitvector_network : python -m pytest -q
+
+def tree_nodes(node):
+    return [node] + [x for child in node.children for x in tree_nodes(child)]
+
+def score_tables(f):
+    return [dict(node.score) for node in tree_nodes(f)]
+
+def full_score(f, instance):
+    # score par un calcul complet de l'arbre, sans le cache de calcul_incremental
+    nb_bits, nb_lanes, inputs, y = pack_instance(instance)
+    result = f.calcul(inputs, nb_bits, nb_lanes)
+    return (nb_lanes*nb_bits - (y ^ result).bit_count()) / (nb_lanes*nb_bits)
+
+# empaquetage
+
+def test_pack_unpack_round_trip():
+    random.seed(0)
+    for nb_bits in [2, 5, 8, 13]:
+        instance, goal = create_rd_instance(4, 6, 37, nb_bits)
+        packed = pack_examples(instance)
+        assert packed[:2] == (nb_bits, 37)
+        assert unpack_instance(packed) == instance
+        assert pack_examples(unpack_instance(packed)) == packed
+
+def test_pack_and_list_caches():
+    random.seed(1)
+    instance, goal = create_rd_instance(3, 5, 20, 6)
+    packed = pack_instance(instance)
+    assert pack_instance(instance) is packed
+    assert pack_instance(packed) is packed
+    assert list_instance(instance) is instance
+    assert list_instance(packed) == instance
+    assert list_instance(packed) is list_instance(packed)
+
+# scores incrémentaux
+
+def test_incremental_score_after_moves_and_rollback():
+    random.seed(2)
+    for k in range(20):
+        instance, goal = create_rd_instance(4, 8, 32, 6)
+        f = create_rd_formula(4, 8, 6)
+        f.start_journal()
+        start_score = f.score_formula(instance)
+        f.update_tree_score(instance)
+        start_tables = score_tables(f)
+        assert start_score == full_score(recreate_formula(f.get_seed()), instance)
+
+        for i in range(10):
+            f.softmax()
+            assert f.score_formula(instance) == full_score(recreate_formula(f.get_seed()), instance)
+            f.update_tree_score(instance)
+            fresh = recreate_formula(f.get_seed())
+            fresh.update_tree_score(instance)
+            assert score_tables(f) == score_tables(fresh)
+
+        f.rollback()
+        assert f.score_formula(instance) == start_score
+        f.update_tree_score(instance)
+        assert score_tables(f) == start_tables
+
+# baux de job_queue
+
+def make_queue(tmp_path, jobs):
+    queue_dir = str(tmp_path)
+    for sub_dir in ["jobs", "leases", "results"]:
+        os.makedirs(f"{queue_dir}/{sub_dir}")
+    for job in jobs:
+        with open(job_paths(queue_dir, job)[0], "w") as file:
+            file.write("")
+    return queue_dir
+
+def age(path, seconds):
+    old = time() - seconds
+    os.utime(path, (old, old))
+
+def test_lock_is_exclusive_and_release_checks_token(tmp_path):
+    queue_dir = make_queue(tmp_path, ["a"])
+    lock_path = job_paths(queue_dir, "a")[1]
+    token = try_lock(lock_path, "w1")
+    assert token is not None and read_token(lock_path) == token
+    assert try_lock(lock_path, "w2") is None
+
+    # un autre jeton ne libère pas le bail, qui est remis en place
+    assert not remove_lock(lock_path, "w2", lambda path: read_token(path) == "w2 autre")
+    assert read_token(lock_path) == token
+    assert remove_lock(lock_path, "w1", lambda path: read_token(path) == token)
+    assert not os.path.exists(lock_path)
+    assert not remove_lock(lock_path, "w1", lambda path: True)
+    assert os.listdir(f"{queue_dir}/leases") == []
+
+def test_reclaim_only_expired_leases(tmp_path):
+    queue_dir = make_queue(tmp_path, ["a"])
+    lock_path = job_paths(queue_dir, "a")[1]
+    token = try_lock(lock_path, "w1")
+    assert not reclaim_expired(lock_path, "w2", 60)
+    assert read_token(lock_path) == token
+    age(lock_path, 120)
+    assert reclaim_expired(lock_path, "w2", 60)
+    assert not os.path.exists(lock_path)
+    assert not reclaim_expired(lock_path, "w2", 60)
+
+def test_reclaimed_lease_is_not_released_by_old_owner(tmp_path):
+    queue_dir = make_queue(tmp_path, ["a"])
+    lock_path = job_paths(queue_dir, "a")[1]
+    job, old_token, nb_remaining = claim_job(queue_dir, "w1", 60)
+    assert (job, nb_remaining) == ("a", 1)
+    age(lock_path, 120)
+
+    job, new_token, nb_remaining = claim_job(queue_dir, "w2", 60)
+    assert job == "a" and new_token != old_token
+    # w1 termine en retard : sa libération ne touche pas le bail de w2
+    assert not remove_lock(lock_path, "w1", lambda path: read_token(path) == old_token)
+    assert read_token(lock_path) == new_token
+
+def test_claim_skips_finished_jobs(tmp_path):
+    queue_dir = make_queue(tmp_path, ["a", "b"])
+    with open(job_paths(queue_dir, "a")[2], "w") as file:
+        file.write("0 1.0\n")
+    job, token, nb_remaining = claim_job(queue_dir, "w1", 60)
+    assert (job, nb_remaining) == ("b", 1)
+    assert claim_job(queue_dir, "w2", 60) == (None, None, 1)
+    with open(job_paths(queue_dir, "b")[2], "w") as file:
+        file.write("0 1.0\n")
+    assert remove_lock(job_paths(queue_dir, "b")[1], "w1", lambda path: read_token(path) == token)
+    assert claim_job(queue_dir, "w2", 60) == (None, None, 0)
+
+def run_heartbeat(lock_path, token):
+    stop = Event()
+    thread = Thread(target=heartbeat, args=(lock_path, token, stop, 0.01))
+    thread.start()
+    sleep(0.1)
+    stop.set()
+    thread.join()
+
+def test_heartbeat_refreshes_only_own_lease(tmp_path):
+    queue_dir = make_queue(tmp_path, ["a"])
+    lock_path = job_paths(queue_dir, "a")[1]
+    token = try_lock(lock_path, "w2")
+    age(lock_path, 120)
+    mtime = os.path.getmtime(lock_path)
+    run_heartbeat(lock_path, "w1 autre")
+    assert os.path.getmtime(lock_path) == mtime
+    run_heartbeat(lock_path, token)
+    assert os.path.getmtime(lock_path) > mtime
+
+# instances partagées
+
+def score_attached(handle, seed):
+    # exécuté dans un processus du pool
+    f = recreate_formula(seed)
+    score = f.score_formula(attach_instance(handle))
+    f.update_tree_score(attach_instance(handle))
+    return score, score_tables(f)
+
+def test_attach_instance_matches_in_process_instance():
+    random.seed(3)
+    instance, goal = create_rd_instance(5, 8, 100, 7)
+    f = create_rd_formula(5, 8, 7)
+    score = f.score_formula(instance)
+    f.update_tree_score(instance)
+    shm, handle = share_instance(instance)
+    try:
+        attached = attach_instance(handle)
+        assert attached == pack_instance(instance)
+        assert list_instance(attached) == instance
+        assert score_attached(handle, f.get_seed()) == (score, score_tables(f))
+        with Pool(1) as pool:
+            assert pool.apply(score_attached, (handle, f.get_seed())) == (score, score_tables(f))
+    finally:
+        release_instance(shm)
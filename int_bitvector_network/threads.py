@@ -0,0 +1,28 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Exécution en threads pour les scoreurs. Les threads partagent l'instance et
+# l'arbre sans copie ni sérialisation, mais ne gagnent du temps que sur un
+# interpréteur sans GIL (build free-threaded de Python >= 3.13) ; avec le GIL on
+# reste en série par défaut. main.benchmark_threads mesure le gain réel.
+
+# None : un thread par coeur si le GIL est désactivé, série sinon ; un entier force ce nombre de threads
+NB_THREADS = None
+_executors = {}
+
+def gil_disabled():
+    return hasattr(sys, "_is_gil_enabled") and not sys._is_gil_enabled()
+
+def nb_threads():
+    if NB_THREADS is not None:
+        return NB_THREADS
+    return os.cpu_count() if gil_disabled() else 1
+
+def thread_map(function, items):
+    k = nb_threads()
+    if k <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    if k not in _executors:
+        _executors[k] = ThreadPoolExecutor(k)
+    return list(_executors[k].map(function, items))